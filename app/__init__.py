@@ -1,10 +1,35 @@
+from os.path import basename as os_basename
+from os.path import splitext as os_splitext
+from queue import Empty, Queue
 from threading import Thread
 from tkinter import filedialog
 
 import customtkinter
 
+from core.kdf_batch_extractor import KDFBatchExtractor, find_KDF_files
 from core.kdf_extractor import KDFExtractor
-from core.txt_select_regions import read_and_filter_time_codes
+from core.kdf_inspector import inspect_KDF_file
+from core.scheduler import get_default_num_worker
+from core.txt_select_regions import get_region_header, iter_filtered_time_codes
+from core.utils import (
+    COMPRESSION_SUFFIXES,
+    TEXT_FORMATS,
+    count_sample_periods,
+    find_sample_periods_window,
+    safe_name,
+)
+from core.worker_pool import WorkerPool
+
+# Number of lines added to the preview textbox at a time
+PREVIEW_PAGE_SIZE = 500
+# The next page is added when the preview is scrolled past this fraction of its content
+PREVIEW_LOAD_MORE_AT = 0.9
+# Interval between two updates of the preview, in ms
+PREVIEW_REFRESH_MS = 100
+# Interval between two updates of the log and the progress bars while converting, in ms
+CONVERT_REFRESH_MS = 100
+# Choice of the compression menu that writes plain text files
+NO_COMPRESSION = "No compression"
 
 # Top level window for select an outputted txt file,
 # define regions on the txt file based on the time code,
@@ -38,6 +63,14 @@ class SelectRegionsTLV(customtkinter.CTkToplevel):
             "%dx%d+%d+%d" % (self.window_width, self.window_height, x + dx, y + dy)
         )
 
+        # Exports run on the worker pool of the App, sized by its number of workers entry
+        shared_data.update(
+            {
+                "worker_pool": master.shared_data.get("worker_pool"),
+                "num_worker_entry": master.shared_data.get("num_worker_entry"),
+            }
+        )
+
         self.checkbox_frame = SelectRegionsSideBarFrame(self)
         self.checkbox_frame.grid(row=0, column=0, padx=10, pady=10, sticky="ns")
 
@@ -99,8 +132,17 @@ class SelectRegionsMainContentFrame(customtkinter.CTkFrame):
         # Log textbox
         self.preview_textbox = customtkinter.CTkTextbox(self)
         shared_data.update({"preview_textbox": self.preview_textbox})
-        self.preview_textbox.grid(
-            row=1, column=0, padx=20, pady=(10, 20), sticky="nsew"
+        self.preview_textbox.grid(row=1, column=0, padx=20, pady=(10, 0), sticky="nsew")
+
+        # Number of datapoints matched by the preview
+        self.preview_count_label = customtkinter.CTkLabel(
+            self,
+            text="",
+            fg_color="transparent",
+        )
+        shared_data.update({"preview_count_label": self.preview_count_label})
+        self.preview_count_label.grid(
+            row=2, column=0, padx=20, pady=(0, 10), sticky="w"
         )
 
 
@@ -111,11 +153,24 @@ class OpenFileTxtButton(customtkinter.CTkButton):
         )
 
     def button_callback(self):
-        file_path = filedialog.askopenfilename(filetypes=[("Text files", "*.txt")])
+        # A KDF file is cut directly, without converting the whole file to txt first
+        file_path = filedialog.askopenfilename(
+            filetypes=[
+                ("Text or KDF files", "*.txt *.kdf"),
+                ("Text files", "*.txt"),
+                ("KDF files", "*.kdf"),
+            ]
+        )
         # Focus to main window after choose file
         self.master.master.focus_force()
 
-        shared_data.get("txt_file_label").configure(text=file_path)
+        shared_data.get("txt_file_label").configure(
+            text=(
+                f"{file_path} (from/to in milliseconds)"
+                if is_KDF_file(file_path)
+                else file_path
+            )
+        )
         shared_data.update({"txt_file_path": file_path if file_path else None})
         if file_path == "":
             shared_data.get("txt_file_label").configure(
@@ -156,57 +211,155 @@ class PreViewRegionsButton(customtkinter.CTkButton):
             corner_radius=12,
             state="disabled",
         )
+        # State of the running preview, replaced on every click so an older reader thread can tell it is outdated
+        self.preview_state = None
 
     def button_callback(self):
         preview_textbox = shared_data.get("preview_textbox", None)
-        try:
-            # Reset textbox
-            preview_textbox.delete("1.0", "end")
-            # Reset txt data
-            shared_data.update({"txt_data": None})
-
-            file_path = shared_data.get("txt_file_path", None)
-            start_time = (
-                shared_data.get("timecode_start_entry").get()
-                if shared_data.get("timecode_start_entry", None)
-                else None
+        preview_count_label = shared_data.get("preview_count_label", None)
+        # Stop the previous preview
+        self.preview_state = None
+        # Reset textbox
+        preview_textbox.delete("1.0", "end")
+        preview_count_label.configure(text="")
+        # Reset txt data
+        shared_data.update({"txt_data": None, "KDF_window": None})
+        shared_data.get("export_btn").configure(state="disabled")
+
+        file_path = shared_data.get("txt_file_path", None)
+        start_time = (
+            shared_data.get("timecode_start_entry").get()
+            if shared_data.get("timecode_start_entry", None)
+            else None
+        )
+        end_time = (
+            shared_data.get("timecode_end_entry").get()
+            if shared_data.get("timecode_end_entry", None)
+            else None
+        )
+        if (
+            file_path is not None
+            and is_KDF_file(file_path)
+            and start_time is not None
+            and end_time is not None
+        ):
+            self.preview_KDF_window(file_path, start_time, end_time)
+        elif file_path is not None and start_time is not None and end_time is not None:
+            self.preview_state = {
+                # Lines matched so far, filled by the reader thread
+                "lines": [],
+                # Number of lines already inserted into the textbox
+                "shown_lines": 0,
+                "done": False,
+                "error": None,
+            }
+            # Read the txt file off the Tk main thread, the textbox is updated by update_preview
+            Thread(
+                target=self.read_preview,
+                args=(self.preview_state, file_path, start_time, end_time),
+                daemon=True,
+            ).start()
+            self.after(PREVIEW_REFRESH_MS, self.update_preview, self.preview_state)
+        else:
+            preview_textbox.insert(
+                "end",
+                "Please select a valid txt file and provide all necessary information and try again",
             )
-            end_time = (
-                shared_data.get("timecode_end_entry").get()
-                if shared_data.get("timecode_end_entry", None)
-                else None
+
+    # Show the number of datapoints of each channel in the window, only the header of the KDF file is read
+    def preview_KDF_window(self, file_path, start_time, end_time):
+        preview_textbox = shared_data.get("preview_textbox", None)
+        try:
+            start_time = float(start_time) if start_time else None
+            end_time = float(end_time) if end_time else None
+            KDF_info = inspect_KDF_file(file_path)
+        except Exception as e:
+            preview_textbox.insert(
+                "end", f"Error: {str(e)}\nFrom/to of a KDF file are milliseconds\n"
             )
-            if (
-                file_path is not None
-                and start_time is not None
-                and end_time is not None
-            ):
-                filtered_time_codes = read_and_filter_time_codes(
-                    file_path, start_time, end_time
+            return
+
+        for channel in KDF_info.channels:
+            if channel.data_enc == "list":
+                preview_textbox.insert("end", f"{channel.label}: whole channel\n")
+            elif channel.unit == "ms":
+                preview_textbox.insert(
+                    "end", f"{channel.label}: datapoints are found on export\n"
                 )
-                # Check if had data
-                if len(filtered_time_codes) != 0:
-                    for line in filtered_time_codes:
-                        preview_textbox.insert("end", line + "\n")
-                    shared_data.update({"txt_data": filtered_time_codes})
-                    # enable export data button
-                    shared_data.get("export_btn").configure(state="normal")
-                else:
-                    preview_textbox.insert(
-                        "end",
-                        "No data",
-                    )
-                    shared_data.get("export_btn").configure(state="disabled")
             else:
+                first, last = find_sample_periods_window(
+                    sample_rate=channel.sample_rate,
+                    num_values=min(
+                        channel.num_records,
+                        count_sample_periods(
+                            sample_rate=channel.sample_rate,
+                            total_values=channel.total_values,
+                        ),
+                    ),
+                    start_time=start_time,
+                    end_time=end_time,
+                )
                 preview_textbox.insert(
-                    "end",
-                    "Please select a valid txt file and provide all necessary information and try again",
+                    "end", f"{channel.label}: {last - first} datapoints\n"
                 )
+        shared_data.update({"KDF_window": (start_time, end_time)})
+        # enable export data button
+        shared_data.get("export_btn").configure(state="normal")
+
+    # Runs in a background thread, only appends to the preview state
+    def read_preview(self, preview_state, file_path, start_time, end_time):
+        try:
+            for line in iter_filtered_time_codes(file_path, start_time, end_time):
+                # A new preview was started, stop reading
+                if preview_state is not self.preview_state:
+                    return
+                preview_state["lines"].append(line)
         except Exception as e:
-            preview_textbox.insert(
-                "end",
-                f"Error: {str(e)}\n",
-            )
+            preview_state["error"] = e
+        preview_state["done"] = True
+
+    # Runs on the Tk main thread, shows the matched lines one page at a time
+    def update_preview(self, preview_state):
+        if preview_state is not self.preview_state:
+            return
+        preview_textbox = shared_data.get("preview_textbox", None)
+        preview_count_label = shared_data.get("preview_count_label", None)
+
+        if preview_state["error"] is not None:
+            preview_textbox.insert("end", f"Error: {str(preview_state['error'])}\n")
+            return
+
+        lines = preview_state["lines"]
+        data_len = len(lines)
+        done = preview_state["done"]
+        preview_count_label.configure(
+            text=f"{data_len} datapoints" + ("" if done else " (searching...)")
+        )
+
+        # Only materialize the next page when the first page is empty or the user scrolled near the bottom
+        shown_lines = preview_state["shown_lines"]
+        if shown_lines < data_len and (
+            shown_lines == 0 or preview_textbox.yview()[1] >= PREVIEW_LOAD_MORE_AT
+        ):
+            page = lines[shown_lines : shown_lines + PREVIEW_PAGE_SIZE]
+            preview_textbox.insert("end", "\n".join(page) + "\n")
+            preview_state["shown_lines"] = shown_lines + len(page)
+
+        if done and not preview_state.get("finished", False):
+            preview_state["finished"] = True
+            # Check if had data
+            if data_len != 0:
+                header = get_region_header(lines[-1], data_len)
+                preview_textbox.insert("1.0", "\n".join(header) + "\n")
+                shared_data.update({"txt_data": header + lines})
+                # enable export data button
+                shared_data.get("export_btn").configure(state="normal")
+            else:
+                preview_textbox.insert("end", "No data")
+
+        # Keep polling while lines are still being read or not all of them are shown
+        if not done or preview_state["shown_lines"] < data_len:
+            self.after(PREVIEW_REFRESH_MS, self.update_preview, preview_state)
 
 
 class ExportButton(customtkinter.CTkButton):
@@ -222,6 +375,10 @@ class ExportButton(customtkinter.CTkButton):
     def button_callback(self):
         txt_data = shared_data.get("txt_data", None)
         preview_textbox = shared_data.get("preview_textbox", None)
+        KDF_window = shared_data.get("KDF_window", None)
+        if KDF_window is not None:
+            self.export_KDF_window(KDF_window)
+            return
         file_path = filedialog.asksaveasfilename(
             defaultextension=".txt",
             filetypes=[("Text files", "*.txt")],
@@ -247,6 +404,91 @@ class ExportButton(customtkinter.CTkButton):
         # Disable export button
         shared_data.get("export_btn").configure(state="disabled")
 
+    # Extract the window of every channel of the KDF file to a folder, only the window is read
+    def export_KDF_window(self, KDF_window):
+        preview_textbox = shared_data.get("preview_textbox", None)
+        num_worker = get_entry_number(shared_data.get("num_worker_entry"))
+        if num_worker is not None and (num_worker < 1 or num_worker != int(num_worker)):
+            preview_textbox.delete("1.0", "end")
+            preview_textbox.insert(
+                "end", "The number of workers must be a whole number of at least 1\n"
+            )
+            return
+        output_dir_path = filedialog.askdirectory()
+        if output_dir_path:
+            preview_textbox.delete("1.0", "end")
+            # Pause and cancel of a conversion act on every extraction of the pool
+            worker_pool = shared_data.get("worker_pool")
+            if not worker_pool.reserve(
+                int(num_worker) if num_worker is not None else get_default_num_worker()
+            ):
+                preview_textbox.insert(
+                    "end", "A conversion is running, export when it is done\n"
+                )
+                return
+            try:
+                extractor = KDFExtractor(
+                    KDF_file_path=shared_data.get("txt_file_path"),
+                    path_save_data=output_dir_path,
+                    num_worker=worker_pool.num_worker,
+                    start_time=KDF_window[0],
+                    end_time=KDF_window[1],
+                )
+                # Events of the extractor thread are only queued, process_events inserts them
+                event_queue = Queue()
+                extractor_thread = Thread(
+                    target=extractor.get_channel_data,
+                    args=(
+                        lambda event: event_queue.put(event["message"]),
+                        lambda: None,
+                    ),
+                    kwargs={"pool": worker_pool},
+                )
+                extractor_thread.start()
+                self.after(
+                    CONVERT_REFRESH_MS,
+                    self.process_events,
+                    extractor_thread,
+                    event_queue,
+                )
+            except Exception as e:
+                worker_pool.release()
+                preview_textbox.insert("end", f"Error: {str(e)}\n")
+        # Disable export button
+        shared_data.get("export_btn").configure(state="disabled")
+
+    # Runs on the Tk main thread until the extractor thread is done
+    def process_events(self, extractor_thread: Thread, event_queue: Queue):
+        extractor_done = not extractor_thread.is_alive()
+        insert_queued_messages(event_queue, shared_data.get("preview_textbox"))
+        if extractor_done:
+            shared_data.get("worker_pool").release()
+        else:
+            self.after(
+                CONVERT_REFRESH_MS,
+                self.process_events,
+                extractor_thread,
+                event_queue,
+            )
+
+
+# Insert every message waiting in the queue with a single insert, runs on the Tk main thread
+def insert_queued_messages(event_queue: Queue, textbox: customtkinter.CTkTextbox):
+    messages = []
+    while True:
+        try:
+            messages.append(event_queue.get_nowait())
+        except Empty:
+            break
+    if len(messages) != 0:
+        textbox.insert("end", "\n".join(messages) + "\n")
+        textbox.see("end")
+
+
+# KDF files are cut by milliseconds, txt files by time code
+def is_KDF_file(file_path: str) -> bool:
+    return bool(file_path) and file_path.lower().endswith(".kdf")
+
 
 # Main app begin
 class SideBarFrame(customtkinter.CTkFrame):
@@ -267,22 +509,68 @@ class SideBarFrame(customtkinter.CTkFrame):
         shared_data.update({"open_file_btn": self.open_file_btn})
         self.open_file_btn.grid(row=1, column=0, padx=10, pady=10, sticky="w")
 
+        # Button select a folder, every KDF file in it is converted
+        self.open_folder_btn = OpenFolderButton(master=self)
+        shared_data.update({"open_folder_btn": self.open_folder_btn})
+        self.open_folder_btn.grid(row=2, column=0, padx=10, pady=10, sticky="w")
+
         # Button select output directory
         self.select_output_dir_btn = SelectOutputDirButton(master=self)
         shared_data.update({"select_output_dir_btn": self.select_output_dir_btn})
-        self.select_output_dir_btn.grid(row=2, column=0, padx=10, pady=10, sticky="w")
+        self.select_output_dir_btn.grid(row=3, column=0, padx=10, pady=10, sticky="w")
+
+        # Checkboxes select the file formats written for each channel
+        self.export_format_checkboxes = {}
+        for row, (file_format, text) in enumerate(
+            (("txt", "TXT"), ("csv", "CSV"), ("npy", "NumPy (.npy)")), start=4
+        ):
+            checkbox = customtkinter.CTkCheckBox(master=self, text=text)
+            if file_format in TEXT_FORMATS:
+                checkbox.select()
+            checkbox.grid(row=row, column=0, padx=10, pady=2, sticky="w")
+            self.export_format_checkboxes.update({file_format: checkbox})
+        shared_data.update({"export_format_checkboxes": self.export_format_checkboxes})
+
+        # Compression of the TXT/CSV files
+        self.compression_menu = customtkinter.CTkOptionMenu(
+            master=self, values=[NO_COMPRESSION, *COMPRESSION_SUFFIXES]
+        )
+        shared_data.update({"compression_menu": self.compression_menu})
+        self.compression_menu.grid(row=7, column=0, padx=10, pady=10, sticky="w")
+
+        # Overrides of the number of workers and the memory limit, empty sizes them automatically
+        self.num_worker_entry = customtkinter.CTkEntry(
+            master=self, placeholder_text="Workers (auto)"
+        )
+        shared_data.update({"num_worker_entry": self.num_worker_entry})
+        self.num_worker_entry.grid(row=8, column=0, padx=10, pady=2, sticky="w")
+
+        self.memory_limit_entry = customtkinter.CTkEntry(
+            master=self, placeholder_text="Memory limit MB (auto)"
+        )
+        shared_data.update({"memory_limit_entry": self.memory_limit_entry})
+        self.memory_limit_entry.grid(row=9, column=0, padx=10, pady=2, sticky="w")
 
         # Button run convert function
         self.convert_btn = ConvertButton(master=self)
         shared_data.update({"convert_btn": self.convert_btn})
-        self.convert_btn.grid(row=3, column=0, padx=10, pady=10, sticky="w")
+        self.convert_btn.grid(row=10, column=0, padx=10, pady=10, sticky="w")
+
+        # Buttons pause/resume and cancel the running conversion
+        self.pause_btn = PauseButton(master=self)
+        shared_data.update({"pause_btn": self.pause_btn})
+        self.pause_btn.grid(row=11, column=0, padx=10, pady=10, sticky="w")
+
+        self.cancel_btn = CancelButton(master=self)
+        shared_data.update({"cancel_btn": self.cancel_btn})
+        self.cancel_btn.grid(row=12, column=0, padx=10, pady=10, sticky="w")
 
 
 class MainContentFrame(customtkinter.CTkFrame):
     def __init__(self, master, shared_data: dict):
         super().__init__(master=master)
         self.grid_columnconfigure(0, weight=1)
-        self.grid_rowconfigure(3, weight=1)
+        self.grid_rowconfigure(4, weight=1)
         # These data are shared throughout the application
         self.shared_data = shared_data
 
@@ -312,10 +600,188 @@ class MainContentFrame(customtkinter.CTkFrame):
         shared_data.update({"output_dir_label": self.output_dir_label})
         self.output_dir_label.grid(row=2, column=0, padx=20, pady=10, sticky="w")
 
+        # Checklist of the channels found in the headers of the selected KDF files
+        self.channel_list_frame = customtkinter.CTkScrollableFrame(
+            self, label_text="Channels", height=80
+        )
+        shared_data.update(
+            {
+                "channel_list_frame": self.channel_list_frame,
+                "channel_checkboxes": {},
+                "channel_progress_bars": {},
+            }
+        )
+        self.channel_list_frame.grid(row=3, column=0, padx=20, pady=10, sticky="ew")
+
         # Log textbox
         self.log_textbox = customtkinter.CTkTextbox(self)
         shared_data.update({"log_textbox": self.log_textbox})
-        self.log_textbox.grid(row=3, column=0, padx=20, pady=(10, 20), sticky="nsew")
+        self.log_textbox.grid(row=4, column=0, padx=20, pady=(10, 0), sticky="nsew")
+
+        # Overall progress of the conversion, with throughput and ETA
+        self.progress_bar = customtkinter.CTkProgressBar(self)
+        self.progress_bar.set(0)
+        shared_data.update({"progress_bar": self.progress_bar})
+        self.progress_bar.grid(row=5, column=0, padx=20, pady=(10, 0), sticky="ew")
+        self.progress_label = customtkinter.CTkLabel(
+            self, text="", fg_color="transparent"
+        )
+        shared_data.update({"progress_label": self.progress_label})
+        self.progress_label.grid(row=6, column=0, padx=20, pady=(0, 10), sticky="w")
+
+
+# Selected export formats of the format checkboxes
+def get_export_formats(shared_data: dict) -> list[str]:
+    return [
+        file_format
+        for file_format, checkbox in shared_data.get("export_format_checkboxes").items()
+        if checkbox.get()
+    ]
+
+
+# Show the channels of the selected KDF files in the log textbox, only the headers are read
+def show_KDF_channels(shared_data: dict, file_paths: list[str]):
+    log_textbox = shared_data.get("log_textbox")
+    log_textbox.delete("1.0", "end")
+    formats = get_export_formats(shared_data)
+    total_output_size = 0
+    for KDF_file_path in file_paths:
+        try:
+            KDF_info = inspect_KDF_file(KDF_file_path)
+        except Exception as e:
+            log_textbox.insert("end", f"{KDF_file_path} - {e}\n")
+            continue
+        file_name = safe_name(os_splitext(os_basename(KDF_file_path))[0])
+        log_textbox.insert("end", f"{KDF_file_path}\n")
+        for channel in KDF_info.channels:
+            output_size = sum(
+                channel.estimate_output_sizes(file_name, formats).values()
+            )
+            total_output_size += output_size
+            log_textbox.insert(
+                "end",
+                f"    {channel.label} ({channel.type}): {channel.num_records} samples, "
+                f"{channel.sample_rate} Hz, {channel.data_size / 1e6:.1f} MB "
+                f"-> ~{output_size / 1e6:.1f} MB\n",
+            )
+    if len(file_paths) != 0:
+        log_textbox.insert(
+            "end", f"Estimated output size: ~{total_output_size / 1e6:.1f} MB\n"
+        )
+
+
+# Fill the channel checklist with the channels of the selected KDF files, every channel is selected
+def update_channel_checklist(shared_data: dict, file_paths: list[str]):
+    for checkbox in shared_data.get("channel_checkboxes").values():
+        checkbox.destroy()
+    for progress_bar in shared_data.get("channel_progress_bars").values():
+        progress_bar.destroy()
+    channel_checkboxes = {}
+    channel_progress_bars = {}
+    for KDF_file_path in file_paths:
+        try:
+            KDF_info = inspect_KDF_file(KDF_file_path)
+        except Exception:
+            continue
+        for channel in KDF_info.channels:
+            # Channels with the same label in several files share one checkbox
+            if channel.label in channel_checkboxes:
+                continue
+            checkbox = customtkinter.CTkCheckBox(
+                master=shared_data.get("channel_list_frame"),
+                text=f"{channel.label} ({channel.type})",
+            )
+            checkbox.select()
+            checkbox.grid(
+                row=len(channel_checkboxes), column=0, padx=10, pady=2, sticky="w"
+            )
+            # Progress of the channel while it is converted
+            progress_bar = customtkinter.CTkProgressBar(
+                master=shared_data.get("channel_list_frame"), width=160
+            )
+            progress_bar.set(0)
+            progress_bar.grid(
+                row=len(channel_checkboxes), column=1, padx=10, pady=2, sticky="e"
+            )
+            channel_checkboxes.update({channel.label: checkbox})
+            channel_progress_bars.update({channel.label: progress_bar})
+    shared_data.update(
+        {
+            "channel_checkboxes": channel_checkboxes,
+            "channel_progress_bars": channel_progress_bars,
+        }
+    )
+
+
+# Show the latest progress snapshot of the conversion, runs on the Tk main thread
+def show_progress(shared_data: dict, snapshot: dict | None):
+    if snapshot is None:
+        shared_data.get("progress_bar").set(0)
+        shared_data.get("progress_label").configure(text="")
+        return
+    shared_data.get("progress_bar").set(snapshot["fraction"])
+    eta = snapshot["eta"]
+    shared_data.get("progress_label").configure(
+        text="%.0f%%   %.2f MB/s   %s"
+        % (
+            snapshot["fraction"] * 100,
+            snapshot["MB/s"],
+            f"ETA {eta:.0f} s" if eta is not None else "",
+        )
+    )
+    for label, fraction in snapshot["channels"].items():
+        progress_bar = shared_data.get("channel_progress_bars").get(label, None)
+        if progress_bar is not None:
+            progress_bar.set(fraction)
+
+
+# Labels of the checked channels, None when every channel is checked
+def get_selected_channel_labels(shared_data: dict) -> list[str] | None:
+    channel_checkboxes = shared_data.get("channel_checkboxes")
+    channel_labels = [
+        channel_label
+        for channel_label, checkbox in channel_checkboxes.items()
+        if checkbox.get()
+    ]
+    if len(channel_labels) == len(channel_checkboxes):
+        return None
+    return channel_labels
+
+
+# A cancelled conversion is resumed by the convert button until the files or the output directory change
+def forget_cancelled_conversion(shared_data: dict):
+    shared_data.update({"batch_extractor": None})
+    shared_data.get("convert_btn").configure(text="Convert")
+
+
+# Number typed in the entry, None when it is empty and -1 when it is not a number >= 0
+def get_entry_number(entry: customtkinter.CTkEntry) -> float | None:
+    text = entry.get().strip()
+    if text == "":
+        return None
+    try:
+        number = float(text)
+    except ValueError:
+        return -1
+    return number if number >= 0 else -1
+
+
+# Save the KDF files to convert and enable the convert button when an output directory is also selected
+def update_selected_files(shared_data: dict, file_paths: list[str], label_text: str):
+    forget_cancelled_conversion(shared_data)
+    shared_data.get("file_label").configure(text=label_text)
+    shared_data.update({"file_paths": file_paths if file_paths else None})
+    show_KDF_channels(shared_data=shared_data, file_paths=file_paths)
+    update_channel_checklist(shared_data=shared_data, file_paths=file_paths)
+    if not file_paths:
+        shared_data.get("file_label").configure(
+            text="Select the path to the KDF file to convert"
+        )
+    # Check if selected file and output directory
+    if shared_data.get("output_dir_path", None) is not None and file_paths:
+        shared_data.get("convert_btn").configure(state="normal")
+    else:
+        shared_data.get("convert_btn").configure(state="disabled")
 
 
 class OpenFileButton(customtkinter.CTkButton):
@@ -325,24 +791,42 @@ class OpenFileButton(customtkinter.CTkButton):
         )
 
     def button_callback(self):
-        file_path = filedialog.askopenfilename(filetypes=[("KDF files", "*.kdf")])
+        # Several files can be selected, they are converted as one batch
+        file_paths = list(
+            filedialog.askopenfilenames(filetypes=[("KDF files", "*.kdf")])
+        )
         # Focus to main window after choose file
         self.master.master.focus_force()
 
-        self.master.shared_data.get("file_label").configure(text=file_path)
-        self.master.shared_data.update({"file_path": file_path if file_path else None})
-        if file_path == "":
-            self.master.shared_data.get("file_label").configure(
-                text="Select the path to the KDF file to convert"
-            )
-        # Check if selected file and output directory
-        if (
-            self.master.shared_data.get("output_dir_path", None) is not None
-            and file_path != ""
-        ):
-            self.master.shared_data.get("convert_btn").configure(state="normal")
-        else:
-            self.master.shared_data.get("convert_btn").configure(state="disabled")
+        update_selected_files(
+            shared_data=self.master.shared_data,
+            file_paths=file_paths,
+            label_text=(
+                file_paths[0]
+                if len(file_paths) == 1
+                else f"{len(file_paths)} KDF files selected"
+            ),
+        )
+
+
+class OpenFolderButton(customtkinter.CTkButton):
+    def __init__(self, master):
+        super().__init__(
+            master, text="Choose folder", command=self.button_callback, corner_radius=12
+        )
+
+    def button_callback(self):
+        folder_path = filedialog.askdirectory()
+        # Focus to main window after choose directory
+        self.master.master.focus_force()
+
+        # Every KDF file in the folder is converted
+        file_paths = find_KDF_files([folder_path]) if folder_path else []
+        update_selected_files(
+            shared_data=self.master.shared_data,
+            file_paths=file_paths,
+            label_text=f"{folder_path} ({len(file_paths)} KDF files)",
+        )
 
 
 class SelectOutputDirButton(customtkinter.CTkButton):
@@ -356,6 +840,7 @@ class SelectOutputDirButton(customtkinter.CTkButton):
         # Focus to main window after choose directory
         self.master.master.focus_force()
 
+        forget_cancelled_conversion(self.master.shared_data)
         self.master.shared_data.get("output_dir_label").configure(text=output_dir_path)
         self.master.shared_data.update(
             {"output_dir_path": output_dir_path if output_dir_path else None}
@@ -367,7 +852,7 @@ class SelectOutputDirButton(customtkinter.CTkButton):
 
         # Check if selected file and output directory
         if (
-            self.master.shared_data.get("file_path", None) is not None
+            self.master.shared_data.get("file_paths", None) is not None
             and output_dir_path != ""
         ):
             self.master.shared_data.get("convert_btn").configure(state="normal")
@@ -390,48 +875,148 @@ class ConvertButton(customtkinter.CTkButton):
         # Rest log textbox
         self.master.shared_data.get("log_textbox").delete("1.0", "end")
 
-        file_path = self.master.shared_data.get("file_path", None)
+        file_paths = self.master.shared_data.get("file_paths", None)
         output_dir_path = self.master.shared_data.get("output_dir_path", None)
-        if output_dir_path and file_path:
+        export_formats = get_export_formats(self.master.shared_data)
+        channel_labels = get_selected_channel_labels(self.master.shared_data)
+        compression = self.master.shared_data.get("compression_menu").get()
+        compression = None if compression == NO_COMPRESSION else compression
+        num_worker = get_entry_number(self.master.shared_data.get("num_worker_entry"))
+        memory_limit = get_entry_number(
+            self.master.shared_data.get("memory_limit_entry")
+        )
+        if num_worker is not None and (num_worker < 1 or num_worker != int(num_worker)):
+            self.master.shared_data.get("log_textbox").insert(
+                "end", "The number of workers must be a whole number of at least 1\n"
+            )
+        elif memory_limit == -1:
+            self.master.shared_data.get("log_textbox").insert(
+                "end", "The memory limit must be a number of MB, 0 for no limit\n"
+            )
+        elif len(export_formats) == 0:
+            self.master.shared_data.get("log_textbox").insert(
+                "end", "Please select at least one export format\n"
+            )
+        elif channel_labels is not None and len(channel_labels) == 0:
+            self.master.shared_data.get("log_textbox").insert(
+                "end", "Please select at least one channel\n"
+            )
+        elif output_dir_path and file_paths:
+            # Pause and cancel act on every extraction of the pool, a window export waits
+            worker_pool = self.master.shared_data.get("worker_pool")
+            if not worker_pool.reserve(
+                int(num_worker) if num_worker is not None else get_default_num_worker()
+            ):
+                self.master.shared_data.get("log_textbox").insert(
+                    "end", "A time window export is running, convert when it is done\n"
+                )
+                return
             try:
                 # Disable select button when process_kdf_file is running
                 self.master.shared_data.get("open_file_btn").configure(state="disabled")
+                self.master.shared_data.get("convert_btn").configure(state="disabled")
+                self.master.shared_data.get("open_folder_btn").configure(
+                    state="disabled"
+                )
                 self.master.shared_data.get("select_output_dir_btn").configure(
                     state="disabled"
                 )
-                on_event = lambda event: self.master.shared_data.get(
-                    "log_textbox"
-                ).insert("end", event["message"] + "\n")
+                # Events of the extractor thread are only queued, process_events inserts them
+                event_queue = Queue()
+                on_event = lambda event: event_queue.put(event["message"])
+
+                # Conversions run on the workers of the App, pause and cancel act on them
+                self.master.shared_data.update(
+                    {"extraction_control": worker_pool.control}
+                )
+                self.master.shared_data.get("pause_btn").configure(
+                    text="Pause", state="normal"
+                )
+                self.master.shared_data.get("cancel_btn").configure(state="normal")
+
+                # The same extractor resumes a cancelled conversion, it skips the channels that were done
+                batch_extractor = self.master.shared_data.get("batch_extractor", None)
+                if batch_extractor is None or (
+                    batch_extractor.formats != tuple(export_formats)
+                    or batch_extractor.channel_labels != channel_labels
+                    or batch_extractor.compression != compression
+                ):
+                    batch_extractor = KDFBatchExtractor(
+                        KDF_file_paths=file_paths,
+                        path_save_data=output_dir_path,
+                        num_worker=worker_pool.num_worker,
+                        formats=tuple(export_formats),
+                        # Unchecked channels are never read from the KDF files
+                        channel_labels=channel_labels,
+                        compression=compression,
+                    )
+                batch_extractor.memory_limit = (
+                    int(memory_limit * 1024 * 1024)
+                    if memory_limit is not None
+                    else None
+                )
 
+                # Runs on the Tk main thread once the extractor thread is done, also after an error
                 def on_succes():
-                    # Reset file patch after process_kdf_file is finished
-                    self.master.shared_data.update({"file_path": None})
-                    self.master.shared_data.get("file_label").configure(
-                        text="Select the path to the KDF file to convert"
+                    worker_pool.release()
+                    self.master.shared_data.get("pause_btn").configure(
+                        text="Pause", state="disabled"
+                    )
+                    self.master.shared_data.get("cancel_btn").configure(
+                        state="disabled"
                     )
+                    if batch_extractor.cancelled:
+                        # Keep the selection, the convert button resumes the conversion
+                        self.master.shared_data.update(
+                            {"batch_extractor": batch_extractor}
+                        )
+                        self.master.shared_data.get("convert_btn").configure(
+                            text="Resume"
+                        )
+                    else:
+                        # Reset file patch after process_kdf_file is finished
+                        self.master.shared_data.update({"file_paths": None})
+                        self.master.shared_data.get("file_label").configure(
+                            text="Select the path to the KDF file to convert"
+                        )
+                        forget_cancelled_conversion(self.master.shared_data)
 
                     # Enable select button when process_kdf_file is finished
                     self.master.shared_data.get("open_file_btn").configure(
                         state="normal"
                     )
+                    self.master.shared_data.get("open_folder_btn").configure(
+                        state="normal"
+                    )
                     self.master.shared_data.get("select_output_dir_btn").configure(
                         state="normal"
                     )
-                    # Disable convert btn when process_kdf_file is finished
+                    # Disable convert btn when process_kdf_file is finished, a cancelled one can be resumed
                     self.master.shared_data.get("convert_btn").configure(
-                        state="disabled"
+                        state="normal" if batch_extractor.cancelled else "disabled"
                     )
 
+                # The extractor thread only stores the latest snapshot, update_progress shows it
+                on_progress = lambda snapshot: self.master.shared_data.update(
+                    {"progress": snapshot}
+                )
+                self.master.shared_data.update({"progress": None})
+                show_progress(self.master.shared_data, None)
+
                 extractor = Thread(
-                    target=KDFExtractor(
-                        KDF_file_path=file_path,
-                        path_save_data=output_dir_path,
-                        num_worker=4,
-                    ).get_channel_data,
-                    args=(on_event, on_succes),
+                    target=batch_extractor.get_channel_data,
+                    args=(on_event, lambda: None, on_progress),
+                    kwargs={"pool": worker_pool},
                 )
                 # extractor.setDaemon(True)
                 extractor.start()
+                self.after(
+                    CONVERT_REFRESH_MS,
+                    self.process_events,
+                    extractor,
+                    event_queue,
+                    on_succes,
+                )
                 # kdf_extractor.get_channel_data(
                 #     on_event=lambda event: self.master.shared_data.get(
                 #         "log_textbox"
@@ -440,6 +1025,7 @@ class ConvertButton(customtkinter.CTkButton):
 
             except Exception as e:
                 print(e)
+                worker_pool.release()
                 self.master.shared_data.get("log_textbox").insert(
                     "end", "\nError: " + str(e) + "\n"
                 )
@@ -448,6 +1034,72 @@ class ConvertButton(customtkinter.CTkButton):
                 "end", "Please provide the full KDF file path and file export path\n"
             )
 
+    # Runs on the Tk main thread until the extractor thread is done, shows the queued
+    # events and the latest progress once per tick
+    def process_events(
+        self, extractor: Thread, event_queue: Queue, on_succes: callable
+    ):
+        # Checked first, so every event of a finished extractor is already in the queue
+        extractor_done = not extractor.is_alive()
+        insert_queued_messages(event_queue, self.master.shared_data.get("log_textbox"))
+        show_progress(self.master.shared_data, self.master.shared_data.get("progress"))
+        if extractor_done:
+            on_succes()
+        else:
+            self.after(
+                CONVERT_REFRESH_MS,
+                self.process_events,
+                extractor,
+                event_queue,
+                on_succes,
+            )
+
+
+class PauseButton(customtkinter.CTkButton):
+    def __init__(self, master):
+        super().__init__(
+            master,
+            text="Pause",
+            command=self.button_callback,
+            corner_radius=12,
+            state="disabled",
+        )
+
+    # Workers finish the chunk they are writing and wait until the conversion is resumed
+    def button_callback(self):
+        control = self.master.shared_data.get("extraction_control", None)
+        if control is None:
+            return
+        if control.is_paused():
+            control.resume()
+            self.configure(text="Pause")
+        else:
+            control.pause()
+            self.configure(text="Resume")
+
+
+class CancelButton(customtkinter.CTkButton):
+    def __init__(self, master):
+        super().__init__(
+            master,
+            text="Cancel",
+            command=self.button_callback,
+            corner_radius=12,
+            state="disabled",
+        )
+
+    # Workers stop at their next chunk and remove their incomplete files, channels that
+    # were already written are kept for the resume
+    def button_callback(self):
+        control = self.master.shared_data.get("extraction_control", None)
+        if control is None:
+            return
+        control.cancel()
+        self.configure(state="disabled")
+        self.master.shared_data.get("pause_btn").configure(
+            text="Pause", state="disabled"
+        )
+
 
 class SelectRegionAndExportButton(customtkinter.CTkButton):
     def __init__(self, master):
@@ -476,7 +1128,7 @@ class SelectRegionAndExportButton(customtkinter.CTkButton):
 class App(customtkinter.CTk):
     def __init__(self):
         super().__init__()
-        self.geometry("800x500")
+        self.geometry("800x600")
         self.title("KDF Extractor")
         self.grid_columnconfigure(1, weight=1)
         self.grid_rowconfigure(0, weight=1)
@@ -485,12 +1137,24 @@ class App(customtkinter.CTk):
         # These data are shared throughout the application
         self.shared_data = {}
 
+        # Worker processes reused by every conversion, they are started in the background
+        # so the first conversion does not wait for them either
+        self.worker_pool = WorkerPool(num_worker=get_default_num_worker())
+        self.shared_data.update({"worker_pool": self.worker_pool})
+        Thread(target=self.worker_pool.warm_up, daemon=True).start()
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+
         self.checkbox_frame = SideBarFrame(self, shared_data=self.shared_data)
         self.checkbox_frame.grid(row=0, column=0, padx=10, pady=10, sticky="ns")
 
         self.main_content_frame = MainContentFrame(self, shared_data=self.shared_data)
         self.main_content_frame.grid(row=0, column=1, padx=10, pady=10, sticky="nsew")
 
+    # The worker processes are stopped with the window
+    def on_close(self):
+        self.worker_pool.shutdown()
+        self.destroy()
+
 
 # app = App()
 # app.mainloop()
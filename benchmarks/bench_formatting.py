@@ -0,0 +1,65 @@
+# Compare the per-sample formatter (data_fromat/float_to_string) with the batched formatter
+# Usage: python -m benchmarks.bench_formatting [num_samples]
+from sys import argv
+from time import perf_counter
+
+from numpy import arange as np_arange
+from numpy import empty as np_empty
+from numpy.random import default_rng
+
+from core.utils import data_fromat, float_to_string, format_string_to_numpy_dtype
+from core.utils.formatter import format_data_column, format_float_column
+
+# Format strings of the channels found in real KDF files (PPG, ECG, ACC/GYRO)
+FORMAT_STRINGS = ["l", "h", "f", "fff", "hhh"]
+
+
+def timed(function, *args):
+    start_time = perf_counter()
+    result = function(*args)
+    return result, perf_counter() - start_time
+
+
+# Build a decoded column the same way sample_data_decode does
+def make_column(format_string: str, num_samples: int):
+    dtype = format_string_to_numpy_dtype(fromat_string=format_string)
+    values = default_rng(0).normal(scale=1000, size=(num_samples, len(format_string)))
+    unpacked_data = np_empty(num_samples, dtype=dtype)
+    if dtype.names is None:
+        unpacked_data[:] = values[:, 0]
+    else:
+        for index, name in enumerate(dtype.names):
+            unpacked_data[name] = values[:, index]
+    return unpacked_data
+
+
+def bench_format_string(format_string: str, num_samples: int):
+    unpacked_data = make_column(format_string, num_samples)
+    old_rows, old_time = timed(lambda: [data_fromat(data) for data in unpacked_data])
+    new_rows, new_time = timed(format_data_column, unpacked_data)
+    assert old_rows == new_rows, f"Output mismatch for '{format_string}'"
+    return old_time, new_time
+
+
+def bench_miliseconds(num_samples: int):
+    miliseconds = np_arange(start=0, stop=num_samples * (1000 / 55), step=1000 / 55)
+    old_rows, old_time = timed(lambda: [float_to_string(ms) for ms in miliseconds])
+    new_rows, new_time = timed(format_float_column, miliseconds)
+    assert old_rows == new_rows, "Output mismatch for miliseconds"
+    return old_time, new_time
+
+
+def report(name: str, num_samples: int, old_time: float, new_time: float):
+    print(
+        "%-12s %10d samples  per-sample %8.3fs  batched %8.3fs  speedup %5.2fx"
+        % (name, num_samples, old_time, new_time, old_time / new_time)
+    )
+
+
+if __name__ == "__main__":
+    num_samples = int(argv[1]) if len(argv) > 1 else 150_000
+    report("miliseconds", num_samples, *bench_miliseconds(num_samples))
+    for format_string in FORMAT_STRINGS:
+        report(
+            format_string, num_samples, *bench_format_string(format_string, num_samples)
+        )
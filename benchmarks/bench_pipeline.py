@@ -0,0 +1,206 @@
+# Time each stage of the extraction pipeline on a synthetic KDF file
+# Usage: python -m benchmarks.bench_pipeline [--duration 600] [--file-format KDFMSGP] [--workers 4]
+from argparse import ArgumentParser
+from os import cpu_count as os_cpu_count
+from os import makedirs as os_makedirs
+from os.path import getsize as os_getsize
+from shutil import rmtree
+from tempfile import mkdtemp
+from time import perf_counter
+
+from core.kdf_extractor import KDFExtractor
+from core.utils import (
+    append_files,
+    compute_sample_periods,
+    data_enc_to_numpy_dtype,
+    format_data_column,
+    format_float_column,
+    iter_sample_periods,
+    sample_data_decode,
+    write_NPY_file,
+    write_text_files,
+)
+
+from .synthetic_kdf import default_channels, write_synthetic_KDF
+
+
+def timed(function, *args, **kwargs):
+    start_time = perf_counter()
+    result = function(*args, **kwargs)
+    return result, perf_counter() - start_time
+
+
+def report(stage: str, seconds: float, num_bytes: int, num_samples: int):
+    print(
+        "%-24s %9.4fs %10.1f MB/s %14.0f samples/s"
+        % (
+            stage,
+            seconds,
+            num_bytes / 1e6 / seconds if seconds > 0 else 0,
+            num_samples / seconds if seconds > 0 else 0,
+        )
+    )
+
+
+# Run each stage of worker_KDF_extract on its own for one channel
+def bench_channel(extractor: KDFExtractor, channel: dict, path_save_data: str) -> str:
+    data_size = int(channel["data_size"])
+    data_offset = int(extractor.header_size) + 14 + int(channel["data_url"])
+    with open(extractor.KDF_file_path, "rb") as KDF_file:
+        KDF_file.seek(data_offset)
+        raw_data = KDF_file.read(data_size)
+    label = channel["label"]
+
+    unpacked_data, seconds = timed(
+        sample_data_decode, data_enc=channel["data_enc"], raw_data=raw_data
+    )
+    num_samples = len(unpacked_data)
+    report(f"{label} decode", seconds, data_size, num_samples)
+
+    (timestamps, miliseconds), seconds = timed(
+        compute_sample_periods,
+        sample_rate=channel["sample_rate"],
+        total_values=channel["total_values"],
+        measured_timestamp=extractor.header["measured_timestamp"],
+    )
+    report(f"{label} timestamps", seconds, data_size, num_samples)
+
+    start_time = perf_counter()
+    miliseconds_text = format_float_column(miliseconds)
+    data_text = format_data_column(unpacked_data)
+    report(f"{label} format", perf_counter() - start_time, data_size, num_samples)
+
+    # The text files are written the way worker_KDF_extract writes them, timestamps and
+    # formatting included, a chunk of rows at a time
+    def write_text(OSC_file_path, CSV_file_path, compression=None) -> float:
+        _, seconds = timed(
+            write_text_files,
+            OSC_file_path=OSC_file_path,
+            CSV_file_path=CSV_file_path,
+            channel_data=f"bench/{label}/{label}",
+            channel_type=label,
+            channel_label=label,
+            file_name="bench",
+            sample_periods=iter_sample_periods(
+                sample_rate=channel["sample_rate"],
+                measured_timestamp=extractor.header["measured_timestamp"],
+                start=0,
+                end=len(timestamps),
+            ),
+            num_rows=num_samples,
+            unpacked_data=unpacked_data,
+            DURATION=miliseconds_text[-1],
+            DATAPOINTS=num_samples,
+            compression=compression,
+        )
+        return seconds
+
+    OSC_file_path = f"{path_save_data}/{label}.txt"
+    seconds = write_text(OSC_file_path, None)
+    report(f"{label} write txt", seconds, os_getsize(OSC_file_path), num_samples)
+
+    CSV_file_path = f"{path_save_data}/{label}.csv"
+    seconds = write_text(None, CSV_file_path)
+    report(f"{label} write csv", seconds, os_getsize(CSV_file_path), num_samples)
+
+    # Both text files in one pass, every chunk of rows is formatted once for both
+    fused_paths = (
+        f"{path_save_data}/{label}.fused.txt",
+        f"{path_save_data}/{label}.fused.csv",
+    )
+    seconds = write_text(*fused_paths)
+    report(
+        f"{label} streamed txt+csv",
+        seconds,
+        os_getsize(fused_paths[0]) + os_getsize(fused_paths[1]),
+        num_samples,
+    )
+
+    # The same with every chunk compressed into its own gzip member
+    compressed_paths = (f"{fused_paths[0]}.gz", f"{fused_paths[1]}.gz")
+    seconds = write_text(*compressed_paths, compression="gzip")
+    report(
+        f"{label} streamed gzip",
+        seconds,
+        os_getsize(compressed_paths[0]) + os_getsize(compressed_paths[1]),
+        num_samples,
+    )
+
+    NPY_file_paths = {
+        "data": f"{path_save_data}/{label}.npy",
+        "timestamps": f"{path_save_data}/{label}.timestamps.npy",
+        "miliseconds": f"{path_save_data}/{label}.miliseconds.npy",
+    }
+    _, seconds = timed(
+        write_NPY_file,
+        NPY_file_paths=NPY_file_paths,
+        NPY_columns={
+            "data": unpacked_data.view(data_enc_to_numpy_dtype(channel["data_enc"])),
+            "timestamps": timestamps[:num_samples],
+            "miliseconds": miliseconds[:num_samples],
+        },
+    )
+    report(f"{label} write npy", seconds, data_size, num_samples)
+    return CSV_file_path
+
+
+def main():
+    parser = ArgumentParser(description="Benchmark the KDF extraction pipeline")
+    parser.add_argument(
+        "--duration", type=float, default=600, help="Seconds of recording"
+    )
+    parser.add_argument(
+        "--file-format", choices=("KDFJSON", "KDFMSGP"), default="KDFJSON"
+    )
+    parser.add_argument("--workers", type=int, default=os_cpu_count() or 1)
+    args = parser.parse_args()
+
+    work_dir = mkdtemp(prefix="kdf_bench_")
+    try:
+        KDF_file_path = f"{work_dir}/bench.kdf"
+        write_synthetic_KDF(
+            KDF_file_path, default_channels(args.duration), args.file_format
+        )
+        KDF_size = os_getsize(KDF_file_path)
+        print(
+            f"{args.file_format} file: {KDF_size / 1e6:.1f} MB, {args.duration:.0f} s"
+        )
+
+        extractor, seconds = timed(
+            KDFExtractor,
+            KDF_file_path=KDF_file_path,
+            path_save_data=f"{work_dir}/stages",
+        )
+        # The extractor only creates its folder when it plans the tasks
+        os_makedirs(extractor.path_save_data, exist_ok=True)
+        channels = extractor.header["channels"]
+        num_samples = sum(channel["total_values"] for channel in channels)
+        report("header parse", seconds, extractor.header_size, 0)
+
+        CSV_file_paths = [
+            bench_channel(extractor, channel, extractor.path_save_data)
+            for channel in channels
+            if channel["data_enc"] != "list"
+        ]
+        data_path = f"{extractor.path_save_data}/data.csv"
+        open(data_path, "wb").close()
+        _, seconds = timed(append_files, data_path, CSV_file_paths)
+        report("data.csv merge", seconds, os_getsize(data_path), num_samples)
+
+        end_to_end = KDFExtractor(
+            KDF_file_path=KDF_file_path,
+            path_save_data=f"{work_dir}/end_to_end",
+            num_worker=args.workers,
+        )
+        _, seconds = timed(
+            end_to_end.get_channel_data,
+            on_event=lambda event: None,
+            on_succes=lambda: None,
+        )
+        report(f"end-to-end ({args.workers} workers)", seconds, KDF_size, num_samples)
+    finally:
+        rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
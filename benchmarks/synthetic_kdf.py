@@ -0,0 +1,120 @@
+# Write synthetic KDF files (KDFJSON / KDFMSGP) for benchmarks
+# Usage: python -m benchmarks.synthetic_kdf out.kdf [duration_seconds] [KDFJSON|KDFMSGP]
+from dataclasses import dataclass, field
+from json import dumps as json_dumps
+from sys import argv
+
+from msgpack import packb as msgpack_packb
+from numpy import empty as np_empty
+from numpy import uint32 as np_uint32
+from numpy.random import default_rng
+
+from core.utils import data_enc_to_numpy_dtype
+
+
+@dataclass
+class SyntheticChannel:
+    label: str
+    type: str
+    # Same layout as the header, e.g. [["x", "f"], ["y", "f"], ["z", "f"]] or "list"
+    data_enc: list | str
+    sample_rate: float = field(default=0)
+    total_values: int = field(default=0)
+    unit: str = field(default="")
+
+
+# Channels found in real recordings: PPG (VS), ECG (H10), 3-axis accelerometer and markers
+def default_channels(duration: float) -> list[SyntheticChannel]:
+    return [
+        SyntheticChannel("Markers", "Markers", "list", total_values=3),
+        SyntheticChannel("PPG", "PPG", [["value", "l"]], 55, int(55 * duration)),
+        SyntheticChannel("ECG", "ECG", [["value", "h"]], 130, int(130 * duration)),
+        SyntheticChannel(
+            "Acc",
+            "Acc",
+            [["x", "f"], ["y", "f"], ["z", "f"]],
+            52,
+            int(52 * duration),
+        ),
+    ]
+
+
+# Encode the samples of a channel the same way a recorder writes them
+def encode_channel(channel: SyntheticChannel, file_format: str, seed: int) -> bytes:
+    if channel.data_enc == "list":
+        events = [
+            {"label": f"Marker {index}", "len": 0, "pos": float(index * 1000)}
+            for index in range(channel.total_values)
+        ]
+        if file_format == "KDFMSGP":
+            return msgpack_packb(events)
+        return json_dumps(events).encode()
+
+    dtype = data_enc_to_numpy_dtype(channel.data_enc)
+    rng = default_rng(seed)
+    values = rng.normal(scale=1000, size=(channel.total_values, len(channel.data_enc)))
+    samples = np_empty(channel.total_values, dtype=dtype)
+    if dtype.names is None:
+        samples[:] = values[:, 0]
+    else:
+        for index, name in enumerate(dtype.names):
+            samples[name] = values[:, index]
+    return samples.tobytes()
+
+
+def write_synthetic_KDF(
+    KDF_file_path: str,
+    channels: list[SyntheticChannel],
+    file_format: str = "KDFJSON",
+    measured_timestamp: str = "2024-03-12T19:13:27Z",
+):
+    channel_data = [
+        encode_channel(channel, file_format, seed)
+        for seed, channel in enumerate(channels)
+    ]
+    header_channels = []
+    data_url = 0
+    for channel, raw_data in zip(channels, channel_data):
+        header_channels.append(
+            {
+                "data_enc": channel.data_enc,
+                "data_size": len(raw_data),
+                "data_url": data_url,
+                "missing_data": [],
+                "total_values": channel.total_values,
+                "type": channel.type,
+                "sample_rate": channel.sample_rate,
+                "label": channel.label,
+                "offset": 0,
+                "scaling_factor": 1,
+                "unit": channel.unit,
+                "description": "",
+            }
+        )
+        data_url += len(raw_data)
+    header = {
+        "channels": header_channels,
+        "create_timestamp": measured_timestamp,
+        "description": "Synthetic recording",
+        "measured_timestamp": measured_timestamp,
+        "state": "finalized",
+    }
+    if file_format == "KDFMSGP":
+        header_data = msgpack_packb(header)
+    else:
+        header_data = json_dumps(header).encode()
+
+    with open(KDF_file_path, "wb") as KDF_file:
+        # 7 bytes identifier, 3 bytes version, 4 bytes header size, header, channel data
+        KDF_file.write(file_format.encode("ascii"))
+        KDF_file.write(b"1.0")
+        KDF_file.write(np_uint32(len(header_data)).astype("<u4").tobytes())
+        KDF_file.write(header_data)
+        for raw_data in channel_data:
+            KDF_file.write(raw_data)
+
+
+if __name__ == "__main__":
+    duration = float(argv[2]) if len(argv) > 2 else 600
+    file_format = argv[3] if len(argv) > 3 else "KDFJSON"
+    write_synthetic_KDF(argv[1], default_channels(duration), file_format)
@@ -0,0 +1,6 @@
+from sys import exit as sys_exit
+
+from core.cli import main
+
+if __name__ == "__main__":
+    sys_exit(main())
@@ -0,0 +1,227 @@
+# Command line interface, runs the same extraction engine as the GUI without importing tkinter
+from argparse import ArgumentParser
+from os.path import basename as os_basename
+from os.path import getsize as os_getsize
+from os.path import splitext as os_splitext
+from sys import exit as sys_exit
+from sys import stderr as sys_stderr
+from time import perf_counter
+
+from .kdf_batch_extractor import KDFBatchExtractor, find_KDF_files
+from .kdf_inspector import inspect_KDF_file
+from .utils import COMPRESSION_SUFFIXES, EXPORT_FORMATS, TEXT_FORMATS, safe_name
+
+
+def build_parser() -> ArgumentParser:
+    parser = ArgumentParser(
+        prog="kdf-extract",
+        description="Extract the channels of KDF files to TXT/CSV/NPY files",
+    )
+    parser.add_argument(
+        "inputs", nargs="+", help="KDF files or folders containing KDF files"
+    )
+    parser.add_argument("-o", "--output", help="Folder to save the extracted files")
+    parser.add_argument(
+        "-l",
+        "--list",
+        action="store_true",
+        help="Only print the channels of the KDF files and the estimated output sizes",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        help="Number of worker processes (default: number of CPUs, fewer when memory is low)",
+    )
+    parser.add_argument(
+        "--memory-limit",
+        type=float,
+        help="MB of memory the running tasks may use together, 0 for no limit"
+        " (default: half of the available memory)",
+    )
+    parser.add_argument(
+        "-f",
+        "--format",
+        dest="formats",
+        action="append",
+        choices=EXPORT_FORMATS,
+        help="Format to write, can be repeated (default: txt and csv)",
+    )
+    parser.add_argument(
+        "-c",
+        "--channel",
+        dest="channel_labels",
+        action="append",
+        help="Label of a channel to extract, can be repeated (default: all channels)",
+    )
+    parser.add_argument(
+        "-t",
+        "--type",
+        dest="channel_types",
+        action="append",
+        help="Type of the channels to extract, e.g. ECG, can be repeated (default: all types)",
+    )
+    parser.add_argument(
+        "--start-ms",
+        type=float,
+        help="Only extract samples at or after this many milliseconds from the start of the recording",
+    )
+    parser.add_argument(
+        "--end-ms",
+        type=float,
+        help="Only extract samples at or before this many milliseconds from the start of the recording",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=8 * 1024 * 1024,
+        help="Channels larger than this many bytes are split across workers",
+    )
+    parser.add_argument(
+        "--no-mmap",
+        action="store_true",
+        help="Read channel data in the main process instead of memory-mapping it in the workers",
+    )
+    parser.add_argument(
+        "--no-channel-csv",
+        action="store_true",
+        help="Only keep data.csv, remove the CSV file of each channel",
+    )
+    parser.add_argument(
+        "-z",
+        "--compress",
+        dest="compression",
+        choices=tuple(COMPRESSION_SUFFIXES),
+        help="Compress the TXT/CSV files and data.csv (.gz, .bz2 or .xz), NPY files are not compressed",
+    )
+    parser.add_argument(
+        "--no-resume",
+        action="store_true",
+        help="Extract every channel again, even when the manifest of an earlier run lists its files as complete",
+    )
+    parser.add_argument(
+        "-q", "--quiet", action="store_true", help="Only print the summary"
+    )
+    parser.add_argument(
+        "--progress",
+        action="store_true",
+        help="Show the overall progress, ETA and throughput on stderr",
+    )
+    return parser
+
+
+# One status line, rewritten in place on every update
+def print_progress(snapshot: dict):
+    eta = snapshot["eta"]
+    sys_stderr.write(
+        "\r%5.1f%%  %7.2f MB/s  ETA %s   "
+        % (
+            snapshot["fraction"] * 100,
+            snapshot["MB/s"],
+            "%.0fs" % eta if eta is not None else "-",
+        )
+    )
+    sys_stderr.flush()
+
+
+# Print the channels of each KDF file, only the headers are read
+def list_channels(KDF_file_paths: list[str], formats: tuple[str, ...]) -> int:
+    num_failed = 0
+    for KDF_file_path in KDF_file_paths:
+        try:
+            KDF_info = inspect_KDF_file(KDF_file_path)
+        except Exception as e:
+            print(f"{KDF_file_path} - {e}")
+            num_failed += 1
+            continue
+        file_name = safe_name(os_splitext(os_basename(KDF_file_path))[0])
+        print(
+            f"{KDF_file_path} ({KDF_info.file_format}, {KDF_info.file_size} bytes,"
+            f" measured {KDF_info.measured_timestamp})"
+        )
+        for channel in KDF_info.channels:
+            output_sizes = channel.estimate_output_sizes(file_name, formats)
+            print(
+                "  %-16s %-10s %10d samples %8s Hz %12d bytes -> ~%d bytes (%s)"
+                % (
+                    channel.label,
+                    channel.type,
+                    channel.num_records,
+                    channel.sample_rate,
+                    channel.data_size,
+                    sum(output_sizes.values()),
+                    ", ".join(output_sizes),
+                )
+            )
+    return 1 if num_failed != 0 else 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    formats = tuple(args.formats) if args.formats else TEXT_FORMATS
+
+    if args.list:
+        return list_channels(find_KDF_files(args.inputs), formats)
+    if args.output is None:
+        parser.error("the following arguments are required: -o/--output")
+
+    extractor = KDFBatchExtractor(
+        KDF_file_paths=args.inputs,
+        path_save_data=args.output,
+        num_worker=args.workers,
+        memory_limit=(
+            int(args.memory_limit * 1024 * 1024)
+            if args.memory_limit is not None
+            else None
+        ),
+        use_mmap=not args.no_mmap,
+        chunk_size=args.chunk_size,
+        keep_channel_csv=not args.no_channel_csv,
+        formats=formats,
+        channel_labels=args.channel_labels,
+        channel_types=args.channel_types,
+        start_time=args.start_ms,
+        end_time=args.end_ms,
+        compression=args.compression,
+        resume=not args.no_resume,
+    )
+    if len(extractor.KDF_file_paths) == 0:
+        print("No KDF files found")
+        return 1
+
+    on_event = (
+        (lambda event: None) if args.quiet else (lambda event: print(event["message"]))
+    )
+
+    start_time = perf_counter()
+    extractor.get_channel_data(
+        on_event=on_event,
+        on_succes=lambda: None,
+        on_progress=print_progress if args.progress else None,
+    )
+    if args.progress:
+        sys_stderr.write("\n")
+    elapsed_time = perf_counter() - start_time
+
+    # Summary, easy to parse for throughput measurements
+    input_size = sum(
+        os_getsize(KDF_file_path)
+        for KDF_file_path in extractor.KDF_file_paths
+        if KDF_file_path not in extractor.failed_files
+    )
+    print(
+        "files=%d failed=%d input_bytes=%d seconds=%.3f MB/s=%.2f"
+        % (
+            len(extractor.KDF_file_paths),
+            len(extractor.failed_files),
+            input_size,
+            elapsed_time,
+            input_size / 1e6 / elapsed_time if elapsed_time > 0 else 0,
+        )
+    )
+    return 1 if len(extractor.failed_files) != 0 else 0
+
+
+if __name__ == "__main__":
+    sys_exit(main())
@@ -25,3 +25,31 @@ class FileWriteError(Exception):
 
     def __post_init__(self):
         super().__init__(self.message)
+
+
+@dataclass
+class UnsupportedFormatError(Exception):
+    message: str = field(
+        default="Unsupported export format, choose from txt, csv and npy", init=False
+    )
+
+    def __post_init__(self):
+        super().__init__(self.message)
+
+
+@dataclass
+class UnsupportedCompressionError(Exception):
+    message: str = field(
+        default="Unsupported compression, choose from gzip, bz2 and lzma", init=False
+    )
+
+    def __post_init__(self):
+        super().__init__(self.message)
+
+
+@dataclass
+class ExtractionCancelledError(Exception):
+    message: str = field(default="The extraction was cancelled", init=False)
+
+    def __post_init__(self):
+        super().__init__(self.message)
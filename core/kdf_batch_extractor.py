@@ -0,0 +1,162 @@
+from dataclasses import dataclass, field
+from os import listdir as os_listdir
+from os.path import isdir as os_isdir
+from os.path import join as os_join
+from typing import Dict, Optional
+
+from .kdf_extractor import KDFExtractor, run_extraction_tasks
+from .utils import TEXT_FORMATS, ExtractionControl
+from .worker_pool import WorkerPool
+
+
+# Expand folders into the KDF files they contain, files are kept as given
+def find_KDF_files(paths: list[str]) -> list[str]:
+    KDF_file_paths = []
+    for path in paths:
+        if os_isdir(path):
+            KDF_file_paths.extend(
+                os_join(path, file_name)
+                for file_name in sorted(os_listdir(path))
+                if file_name.lower().endswith(".kdf")
+            )
+        else:
+            KDF_file_paths.append(path)
+    return KDF_file_paths
+
+
+# Convert many KDF files with one process pool, channels of all files are scheduled together
+@dataclass
+class KDFBatchExtractor:
+    # KDF files and/or folders containing KDF files
+    KDF_file_paths: list[str]
+    path_save_data: str
+    # None sizes the pool from the CPUs and the available memory
+    num_worker: Optional[int] = field(default=None)
+    # Bytes of memory the running tasks of all files may use together, None uses a part
+    # of the available memory, 0 means no limit
+    memory_limit: Optional[int] = field(default=None)
+    # Options passed to the KDFExtractor of each file
+    use_mmap: bool = field(default=True)
+    chunk_size: int = field(default=8 * 1024 * 1024)
+    keep_channel_csv: bool = field(default=True)
+    formats: tuple[str, ...] = field(default=TEXT_FORMATS)
+    channel_labels: Optional[list[str]] = field(default=None)
+    channel_types: Optional[list[str]] = field(default=None)
+    # Time window in milliseconds from the start of each recording
+    start_time: Optional[float] = field(default=None)
+    end_time: Optional[float] = field(default=None)
+    compression: Optional[str] = field(default=None)
+    resume: bool = field(default=True)
+    # Files that could not be read or with a channel that could not be written,
+    # filled by get_channel_data
+    failed_files: list[str] = field(default_factory=list, init=False)
+    # Channels of each KDF file that were done when the extraction was cancelled, skipped on resume
+    completed_task_ids: Dict[str, set[int]] = field(default_factory=dict, init=False)
+    # The last call of get_channel_data was cancelled
+    cancelled: bool = field(default=False, init=False)
+
+    def __post_init__(self):
+        self.KDF_file_paths = find_KDF_files(self.KDF_file_paths)
+
+    # on_progress receives ProgressTracker.snapshot() of all files while the workers run.
+    # control pauses, resumes or cancels the workers, calling get_channel_data again after
+    # a cancellation only extracts the channels that were not done
+    def get_channel_data(
+        self,
+        on_event: callable,
+        on_succes: callable,
+        on_progress: Optional[callable] = None,
+        control: Optional[ExtractionControl] = None,
+        pool: Optional[WorkerPool] = None,
+    ):
+        num_files = len(self.KDF_file_paths)
+        self.failed_files = []
+        extractors = []
+        tasks = []
+        for file_index, KDF_file_path in enumerate(self.KDF_file_paths):
+            try:
+                extractor = KDFExtractor(
+                    KDF_file_path=KDF_file_path,
+                    path_save_data=self.path_save_data,
+                    num_worker=self.num_worker,
+                    memory_limit=self.memory_limit,
+                    use_mmap=self.use_mmap,
+                    chunk_size=self.chunk_size,
+                    keep_channel_csv=self.keep_channel_csv,
+                    formats=self.formats,
+                    channel_labels=self.channel_labels,
+                    channel_types=self.channel_types,
+                    start_time=self.start_time,
+                    end_time=self.end_time,
+                    compression=self.compression,
+                    resume=self.resume,
+                )
+                extractor.completed_task_ids = self.completed_task_ids.setdefault(
+                    KDF_file_path, set()
+                )
+                file_tasks = extractor.plan_tasks()
+                extractor.report_resumed_channels(on_event=on_event)
+            except Exception as e:
+                # A broken file is reported and skipped, the other files are still converted
+                on_event({"task_id": None, "message": f"{KDF_file_path} - {e}"})
+                self.failed_files.append(KDF_file_path)
+                extractors.append(None)
+                continue
+            # Task ids are only unique inside one file, prefix them with the index of the file
+            for kwargs in file_tasks:
+                kwargs["task_id"] = (file_index, kwargs["task_id"])
+            tasks.extend(file_tasks)
+            extractors.append(extractor)
+
+        # Files that could not be read were already reported
+        num_done_files = extractors.count(None)
+
+        # Every task of the file ended, data.csv is built from its channel files.
+        # A file with a channel that could not be written is counted as failed
+        def on_file_done(file_index: int):
+            nonlocal num_done_files
+            extractor = extractors[file_index]
+            status = "done"
+            if not extractor.write_data_csv(on_event=on_event):
+                self.failed_files.append(extractor.KDF_file_path)
+                status = "failed"
+            num_done_files += 1
+            on_event(
+                {
+                    "task_id": None,
+                    "message": f"[{num_done_files}/{num_files}] {extractor.KDF_file_path} - {status}",
+                }
+            )
+
+        # Files without any channel to extract (or all resumed) are already done
+        for file_index, extractor in enumerate(extractors):
+            if extractor is not None and len(extractor.task_ids) == 0:
+                on_file_done(file_index)
+
+        self.cancelled = run_extraction_tasks(
+            extractors=extractors,
+            tasks=tasks,
+            on_event=on_event,
+            on_file_done=on_file_done,
+            on_progress=on_progress,
+            control=control,
+            pool=pool,
+            num_worker=self.num_worker,
+            memory_limit=self.memory_limit,
+            use_mmap=self.use_mmap,
+        )
+        if self.cancelled:
+            on_event({"task_id": None, "message": "Extraction cancelled"})
+            return
+
+        on_succes()
+
+        if len(self.failed_files) != 0:
+            on_event(
+                {
+                    "task_id": None,
+                    "message": f"Extraction finished with errors, {len(self.failed_files)} file(s) failed",
+                }
+            )
+            return
+        on_event({"task_id": None, "message": "Extracted files successfully"})
@@ -1,121 +1,332 @@
-# Import typing
-from concurrent.futures import ProcessPoolExecutor
-
 # Import libs
 from dataclasses import dataclass, field
-from json import loads as json_loads
+from io import StringIO
 from multiprocessing import Pipe
 from os import makedirs as os_makedirs
+from os import remove as os_remove
 from os.path import basename as os_basename
 from os.path import exists as os_exists
 from os.path import splitext as os_splitext
-from typing import BinaryIO, Dict, Optional
-
-from msgpack import unpackb as msgpack_unpackb
-
-from .exceptions import FileWriteError, HeaderNotFoundError, ParserDataError
-from .utils import csv_writer, np_dtype, np_frombuffer, safe_name, worker_KDF_extract
+from typing import Dict, Optional
+
+from .exceptions import (
+    FileWriteError,
+    HeaderNotFoundError,
+    ParserDataError,
+    UnsupportedFormatError,
+)
+from .kdf_inspector import KDFFileInfo, inspect_KDF_file
+from .manifest import ExtractionManifest, load_manifest
+from .scheduler import TaskScheduler, get_default_num_worker, resolve_memory_limit
+from .utils import (
+    CONTROL_POLL_INTERVAL,
+    EXPORT_FORMATS,
+    NPY_COLUMNS,
+    TEXT_FORMATS,
+    ExtractionControl,
+    ProgressTracker,
+    append_files,
+    calculate_bytes_of_record,
+    cancel_pending_futures,
+    channel_part_path,
+    combine_checksums,
+    compress_block,
+    compression_suffix,
+    count_sample_periods,
+    csv_writer,
+    data_enc_to_numpy_dtype,
+    find_sample_periods_window,
+    float_to_string,
+    np_dtype,
+    open_output_file,
+    read_channel_data,
+    remove_files,
+    safe_name,
+    split_channel_records,
+    stitch_channel_parts,
+    worker_KDF_extract,
+)
+from .worker_pool import WorkerPool, open_worker_pool
 
 
 @dataclass
 class KDFExtractor:
     KDF_file_path: str
     path_save_data: str
-    num_worker: int = field(default=1)
-    KDF_file: Optional[BinaryIO] = field(default=None, init=False, repr=False)
+    # None sizes the pool from the CPUs and the available memory
+    num_worker: Optional[int] = field(default=None)
+    # Workers map their own channel slice of the KDF file instead of receiving a copy of the data
+    use_mmap: bool = field(default=True)
+    # Channels larger than chunk_size bytes are split into record ranges decoded by several workers
+    chunk_size: int = field(default=8 * 1024 * 1024)
+    # Keep the CSV file of each channel next to data.csv
+    keep_channel_csv: bool = field(default=True)
+    # Files written for each channel, any of EXPORT_FORMATS ("txt", "csv", "npy")
+    formats: tuple[str, ...] = field(default=TEXT_FORMATS)
+    # Labels and/or types of the channels to extract, a channel matching either is extracted.
+    # None for both extracts every channel
+    channel_labels: Optional[list[str]] = field(default=None)
+    channel_types: Optional[list[str]] = field(default=None)
+    # Only extract the samples whose milliseconds (from the start of the recording) are in
+    # [start_time, end_time], None leaves that side open. List channels are always extracted whole
+    start_time: Optional[float] = field(default=None)
+    end_time: Optional[float] = field(default=None)
+    # Bytes of memory the running tasks may use together, tasks wait until running ones end.
+    # None uses a part of the available memory (see MEMORY_LIMIT_FRACTION), 0 means no limit
+    memory_limit: Optional[int] = field(default=None)
+    # Compress the .txt/.csv files and data.csv with "gzip", "bz2" or "lzma", None writes plain text.
+    # .npy files are never compressed
+    compression: Optional[str] = field(default=None)
+    # Skip the channels whose files the manifest of an earlier run lists as complete and unchanged
+    resume: bool = field(default=True)
     header_size: None | int = field(default=None, init=False)
     header: None | Dict[str, any] = field(default=None, init=False)
+    KDF_info: Optional[KDFFileInfo] = field(default=None, init=False, repr=False)
     file_name: str = field(init=False)
-
-    def __del__(self):
-        # Close KDF file if it is exist
-        if self.KDF_file is not None:
-            self.KDF_file.close()
+    task_ids: Dict[int, int] = field(default_factory=dict, init=False, repr=False)
+    split_channels: Dict[int, Dict[str, any]] = field(
+        default_factory=dict, init=False, repr=False
+    )
+    part_names: list[str] = field(default_factory=list, init=False, repr=False)
+    # Channels whose files were written by an earlier run, they are skipped when the extraction is resumed
+    completed_task_ids: set[int] = field(default_factory=set, init=False, repr=False)
+    # The last call of get_channel_data was cancelled
+    cancelled: bool = field(default=False, init=False, repr=False)
+    # The last call of get_channel_data could not write every file
+    failed: bool = field(default=False, init=False, repr=False)
+    # Tasks of the current run that were cancelled before they were done
+    cancelled_task_ids: set[int] = field(default_factory=set, init=False, repr=False)
+    # Tasks of the current run that could not write all their files
+    failed_task_ids: set[int] = field(default_factory=set, init=False, repr=False)
+    # Label of the channel of each planned task
+    task_labels: Dict[int, str] = field(default_factory=dict, init=False, repr=False)
+    # Size and CRC-32 of the files written by each task (by file name), sent with "end"
+    task_files: Dict[int, Dict[str, Dict[str, any]]] = field(
+        default_factory=dict, init=False, repr=False
+    )
+    # Channels skipped by the current run because the manifest lists them as complete
+    resumed_channels: list[str] = field(default_factory=list, init=False, repr=False)
+    manifest: Optional[ExtractionManifest] = field(default=None, init=False, repr=False)
+    # data.csv of an earlier run is complete, the channel CSV files it was built from may be gone
+    data_csv_complete: bool = field(default=False, init=False, repr=False)
 
     def __post_init__(self):
+        self.formats = tuple(self.formats)
+        if len(self.formats) == 0 or any(
+            file_format not in EXPORT_FORMATS for file_format in self.formats
+        ):
+            raise UnsupportedFormatError
+        # Raises UnsupportedCompressionError for an unknown codec
+        compression_suffix(self.compression)
+
         try:
             filename_with_extension = os_basename(self.KDF_file_path)
             filename_without_extension = os_splitext(filename_with_extension)[0]
             self.file_name = safe_name(filename_without_extension)
             # Update the path to save the file and add a subfolder that is the name of the KDF file to be extracted
             self.path_save_data = f"{self.path_save_data}/{self.file_name}"
-
-            # Create a directory containing the exported data files if it does not already exist
-            if not os_exists(self.path_save_data):
-                os_makedirs(self.path_save_data)
-
-            # Read headers from KDF file
-            # Open KDF file and save it to self.KDF_file
-            self.KDF_file = open(self.KDF_file_path, "rb")
-            # Read format_identifier
-            file_format_identifier = self.KDF_file.read(7).decode("ascii")
-            # Skip format_version because it is not use
-            self.KDF_file.seek(10)
-            # file_format_version = self.KDF_file.read(3).decode("ascii")
-            self.header_size = np_frombuffer(
-                self.KDF_file.read(4), dtype=np_dtype("<I"), count=1
-            )[0]
-            header_data = self.KDF_file.read(self.header_size)
-
-            if file_format_identifier == "KDFJSON":
-                self.header = json_loads(header_data)
-            elif file_format_identifier == "KDFMSGP":
-                self.header = msgpack_unpackb(header_data, raw=False)
         except:
             raise HeaderNotFoundError
 
-    # Read channel data contained in KDF files
-    def get_channel_data(self, on_event: callable, on_succes: callable):
+        # Only the header is read here, the output folder is created when the tasks are planned
+        self.KDF_info = inspect_KDF_file(self.KDF_file_path)
+        self.header_size = self.KDF_info.header_size
+        self.header = self.KDF_info.header
+
+    # Check if only a time window of the recording is extracted
+    def has_time_window(self) -> bool:
+        return self.start_time is not None or self.end_time is not None
+
+    # Check if the channel was selected by channel_labels or channel_types
+    def is_channel_selected(self, channel: Dict[str, any]) -> bool:
+        if self.channel_labels is None and self.channel_types is None:
+            return True
+        return (
+            self.channel_labels is not None and channel["label"] in self.channel_labels
+        ) or (self.channel_types is not None and channel["type"] in self.channel_types)
+
+    # Build the keyword arguments of every worker task (without the pipe), one task per channel or channel part
+    def plan_tasks(self) -> list[Dict[str, any]]:
         if self.header is None or self.header_size is None:
             raise HeaderNotFoundError
 
-        if self.KDF_file is None:
-            raise HeaderNotFoundError
-
         channels = self.header.get("channels", None)
         if channels is None:
             raise HeaderNotFoundError
 
         measured_timestamp = self.header["measured_timestamp"]
 
-        # Create a pipe to communicate between main process and child process
-        parent_pipe, child_pipe = Pipe()
-        # ID of the tasks assigned to the worker
-        task_ids = []
+        # Create a directory containing the exported data files if it does not already exist
+        if not os_exists(self.path_save_data):
+            os_makedirs(self.path_save_data)
+
+        # The files of an earlier run are only reused for the same KDF file and time window
+        self.manifest = load_manifest(
+            path_save_data=self.path_save_data,
+            source={
+                "file_size": self.KDF_info.file_size,
+                "mtime_ns": self.KDF_info.mtime_ns,
+                "start_time": self.start_time,
+                "end_time": self.end_time,
+                "compression": self.compression,
+            },
+        )
+
+        # ID of the tasks assigned to the worker, mapped to the number of parts still running
+        self.task_ids = {}
+        # Channels split into record ranges, used to stitch the parts once they are all done
+        self.split_channels = {}
         # Contains the names of the channel_labels, which will be used to merge the CSV files of the channels into one data.csv file
-        part_names = []
-        with ProcessPoolExecutor(max_workers=self.num_worker) as executor:
-            for task_id, channel in enumerate(channels):
-                data_enc = channel["data_enc"]
-                data_size = channel["data_size"]
-                # data_url is data offset
-                data_url = channel["data_url"]
-                # Sampling rate per second
-                sample_rate = channel["sample_rate"]
-                # The total number of samples was recorded
-                total_values = channel["total_values"]
-                unit = channel["unit"]
-                channel_label = channel["label"]
-
-                # Add channel_labels to part_names, used to merge the individual CSV files of each sensor into one data.csv file
-                part_names.append(channel_label)
-
-                channel_type = channel["type"]
-
-                # Parser data_size and data_offset to int
-                try:
-                    data_size = int(data_size)
-                    data_url = int(data_url)
-                except:
-                    raise ParserDataError
+        self.part_names = []
+        self.cancelled_task_ids = set()
+        self.failed_task_ids = set()
+        self.task_labels = {}
+        self.task_files = {}
+        self.resumed_channels = []
+        selected_labels = [
+            channel["label"]
+            for channel in channels
+            if self.is_channel_selected(channel)
+        ]
+        # Channel CSV files deleted after data.csv was built (keep_channel_csv is False) are
+        # only skipped while every channel and data.csv are complete, data.csv cannot be
+        # built again without them
+        self.data_csv_complete = (
+            self.resume
+            and "csv" in self.formats
+            and self.manifest.is_data_csv_complete(selected_labels)
+            and all(
+                self.manifest.is_channel_complete(
+                    channel_label, self.formats, allow_removed=True
+                )
+                for channel_label in selected_labels
+            )
+        )
+        tasks = []
+        for task_id, channel in enumerate(channels):
+            # Channels that were not selected are never read, decoded or merged into data.csv
+            if not self.is_channel_selected(channel):
+                continue
+
+            data_enc = channel["data_enc"]
+            data_size = channel["data_size"]
+            # data_url is data offset
+            data_url = channel["data_url"]
+            # Sampling rate per second
+            sample_rate = channel["sample_rate"]
+            # The total number of samples was recorded
+            total_values = channel["total_values"]
+            unit = channel["unit"]
+            channel_label = channel["label"]
+
+            # Add channel_labels to part_names, used to merge the individual CSV files of each sensor into one data.csv file
+            self.part_names.append(channel_label)
+
+            # The files of this channel are complete, it is not extracted again
+            if task_id in self.completed_task_ids:
+                continue
+            if self.resume and (
+                self.data_csv_complete
+                or self.manifest.is_channel_complete(channel_label, self.formats)
+            ):
+                self.completed_task_ids.add(task_id)
+                self.resumed_channels.append(channel_label)
+                continue
+            # The files are rewritten, they are only listed again once they are complete
+            self.manifest.remove_channel(channel_label)
+            self.task_labels[task_id] = channel_label
+
+            channel_type = channel["type"]
+
+            # Parser data_size and data_offset to int
+            try:
+                data_size = int(data_size)
+                data_url = int(data_url)
+            except:
+                raise ParserDataError
+
+            data_offset = int(self.header_size) + 14 + data_url
+
+            # Fixed-rate channels larger than chunk_size are split into record ranges, one worker per range.
+            # List channels and 'ms' channels (timestamps are a cumulative sum) are always extracted whole
+            record_ranges = [None]
+            time_window = None
+            if data_enc != "list" and unit != "ms":
+                format_string = "".join(format_char for _, format_char in data_enc)
+                record_size = calculate_bytes_of_record(format_string)
+                num_records = data_size // record_size
+                num_values = count_sample_periods(
+                    sample_rate=sample_rate, total_values=total_values
+                )
+                # Last sample period, it is the DURATION of the channel
+                last_value = num_values
+                first, last = 0, num_records
+                if self.has_time_window():
+                    # The offset of a record follows from its index, only the records of the window are read
+                    first, last = find_sample_periods_window(
+                        sample_rate=sample_rate,
+                        num_values=min(num_records, num_values),
+                        start_time=self.start_time,
+                        end_time=self.end_time,
+                    )
+                    last_value = last
+                    record_ranges = [(first, last)]
+
+                window_size = (last - first) * record_size
+                if window_size > self.chunk_size:
+                    record_ranges = [
+                        (first + start, first + end)
+                        for start, end in split_channel_records(
+                            data_size=window_size,
+                            record_size=record_size,
+                            chunk_size=self.chunk_size,
+                        )
+                    ]
+                    self.split_channels[task_id] = {
+                        "channel_label": channel_label,
+                        "num_parts": len(record_ranges),
+                        "DURATION": (
+                            float_to_string((last_value - 1) * (1000 / sample_rate))
+                            if last_value > first
+                            else float_to_string(0)
+                        ),
+                        "DATAPOINTS": last - first,
+                        "formats": self.formats,
+                        "compression": self.compression,
+                        # dtype and number of rows of each .npy file, needed for the header of the stitched file
+                        "NPY_dtypes": {
+                            "data": (
+                                data_enc_to_numpy_dtype(data_enc),
+                                last - first,
+                            ),
+                            "timestamps": (
+                                np_dtype("datetime64[ms]"),
+                                min(last, num_values) - first,
+                            ),
+                            "miliseconds": (
+                                np_dtype("float64"),
+                                min(last, num_values) - first,
+                            ),
+                        },
+                    }
+            # Rows of 'ms' channels are only known after summing the data, the worker searches the window
+            elif unit == "ms" and self.has_time_window():
+                time_window = (self.start_time, self.end_time)
 
-                self.KDF_file.seek(self.header_size + 14 + data_url)
-                raw_data = self.KDF_file.read(data_size)
+            for part_index, record_range in enumerate(record_ranges):
+                part_offset, part_size = data_offset, data_size
+                if record_range is not None:
+                    part_offset = data_offset + record_range[0] * record_size
+                    part_size = (record_range[1] - record_range[0]) * record_size
 
                 kwargs = {
                     "data_enc": data_enc,
                     "unit": unit,
-                    "raw_data": raw_data,
+                    # Without use_mmap the data is read by read_task_data just before the task is submitted
+                    "raw_data": None,
+                    "KDF_file_path": self.KDF_file_path,
+                    "data_offset": part_offset,
+                    "data_size": part_size,
                     "measured_timestamp": measured_timestamp,
                     "total_values": total_values,
                     "sample_rate": sample_rate,
@@ -123,134 +334,392 @@ class KDFExtractor:
                     "channel_type": channel_type,
                     "file_name": self.file_name,
                     "path_save_data": self.path_save_data,
-                    "pipe": child_pipe,
                     "task_id": task_id,
+                    "record_range": record_range,
+                    "part_index": (
+                        part_index if task_id in self.split_channels else None
+                    ),
+                    "formats": self.formats,
+                    "time_window": time_window,
+                    "compression": self.compression,
                 }
-                executor.submit(worker_KDF_extract, **kwargs)
-                task_ids.append(task_id)
-
-            # Listen for events emitted from the child process and emit them out through the callback function
-            while True:
-                event = parent_pipe.recv()
-                if event["message"] == "end":
-                    task_ids.pop()
-                    if len(task_ids) == 0:
-                        break
-                else:
-                    on_event(event)
-
-            # Close the stream, no more events will be emitted
-            child_pipe.close()
-            parent_pipe.close()
-
-            try:
-                # Write CSV file with complete data (Contains data of all sensors)
-                data_path = f"{self.path_save_data}/data.csv"
-                with open(file=data_path, mode="w", newline="") as CSV_file:
-                    header = [
-                        "Timestamp",
-                        "Milliseconds",
-                        "FileName",
-                        "SensorType",
-                        "Channel",
-                        "Data",
-                    ]
-                    csvwriter = csv_writer(CSV_file)
-                    # Write CSV headers
-                    csvwriter.writerow(header)
-                    for part_name in part_names:
-                        with open(
-                            f"{self.path_save_data}/{part_name}.csv", "r"
-                        ) as part_file:
-                            CSV_file.write(part_file.read())
-                on_event(
-                    {"task_id": "write_data.csv", "message": f"{data_path} - saved"}
+                tasks.append(kwargs)
+            self.task_ids[task_id] = len(record_ranges)
+
+        self.manifest.save()
+        return tasks
+
+    # Called when a worker sent "end" with the checksums of the files it wrote,
+    # returns True when every task of this KDF file is done
+    def on_task_end(
+        self,
+        task_id: int,
+        on_event: callable,
+        files: Optional[Dict[str, Dict[str, any]]] = None,
+    ) -> bool:
+        self.task_files.setdefault(task_id, {}).update(files or {})
+        self.task_ids[task_id] -= 1
+        if self.task_ids[task_id] == 0:
+            self.task_ids.pop(task_id)
+            # A channel with a cancelled or failed part is not stitched, its parts are incomplete
+            if task_id in self.cancelled_task_ids or task_id in self.failed_task_ids:
+                self.remove_channel_parts(task_id)
+                return len(self.task_ids) == 0
+            # All parts of a split channel are done, join them into the channel files
+            if task_id in self.split_channels:
+                try:
+                    checksums = stitch_channel_parts(
+                        path_save_data=self.path_save_data,
+                        part_checksums=self.task_files[task_id],
+                        **self.split_channels[task_id],
+                    )
+                    self.task_files[task_id] = {
+                        os_basename(file_path): checksum
+                        for file_path, checksum in checksums.items()
+                    }
+                    for saved_path in checksums:
+                        on_event(
+                            {"task_id": task_id, "message": f"{saved_path} - saved"}
+                        )
+                except FileWriteError as e:
+                    on_event({"task_id": task_id, "message": str(e)})
+                    self.failed_task_ids.add(task_id)
+            if task_id not in self.failed_task_ids:
+                self.on_channel_complete(task_id)
+        return len(self.task_ids) == 0
+
+    # Every file of the channel was written, record them in the manifest with the
+    # checksums the workers computed while writing
+    def on_channel_complete(self, task_id: int):
+        self.completed_task_ids.add(task_id)
+        channel_label = self.task_labels[task_id]
+        try:
+            self.manifest.add_channel(
+                channel_label=channel_label,
+                formats=self.formats,
+                files=self.task_files.pop(task_id, {}),
+            )
+            self.manifest.save()
+        except OSError:
+            # Without a manifest entry the channel is extracted again by the next run
+            self.manifest.remove_channel(channel_label)
+
+    # Read the data of a task in the main process when the workers do not map the KDF file
+    def read_task_data(self, kwargs: Dict[str, any]):
+        if not self.use_mmap:
+            kwargs["raw_data"] = read_channel_data(
+                KDF_file_path=kwargs["KDF_file_path"],
+                data_offset=kwargs["data_offset"],
+                data_size=kwargs["data_size"],
+            )
+
+    # Report the channels that were not extracted again because their files are complete
+    def report_resumed_channels(self, on_event: callable):
+        for channel_label in self.resumed_channels:
+            on_event(
+                {
+                    "task_id": None,
+                    "message": f"{self.path_save_data}/{channel_label} - complete, skipped",
+                }
+            )
+
+    # A part of the channel was cancelled, the part files the other parts wrote are incomplete
+    def remove_channel_parts(self, task_id: int):
+        split_channel = self.split_channels.get(task_id, None)
+        if split_channel is None:
+            return
+        remove_files(
+            [
+                channel_part_path(
+                    self.path_save_data,
+                    split_channel["channel_label"],
+                    part_index,
+                    extension,
                 )
-
-            except:
+                for part_index in range(split_channel["num_parts"])
+                for extension in (
+                    f"txt{compression_suffix(self.compression)}",
+                    f"csv{compression_suffix(self.compression)}",
+                    *NPY_COLUMNS.values(),
+                )
+            ]
+        )
+
+    # Write CSV file with complete data (Contains data of all sensors).
+    # Returns False when a channel or data.csv could not be written
+    def write_data_csv(self, on_event: callable) -> bool:
+        suffix = compression_suffix(self.compression)
+        data_path = f"{self.path_save_data}/data.csv{suffix}"
+        # A data.csv without the channels that failed would look complete, also remove the
+        # one of an earlier run
+        if len(self.failed_task_ids) != 0:
+            if "csv" in self.formats:
+                remove_files([data_path])
                 on_event(
                     {
                         "task_id": "write_data.csv",
-                        "message": f"data.csv - {FileWriteError}",
+                        "message": f"{data_path} - not written, {len(self.failed_task_ids)} channel(s) failed",
                     }
                 )
+            return False
+        # data.csv is only built from the channel CSV files
+        if "csv" not in self.formats:
+            return True
+        if self.data_csv_complete:
+            on_event(
+                {
+                    "task_id": "write_data.csv",
+                    "message": f"{data_path} - complete, skipped",
+                }
+            )
+            return True
 
-            on_succes()
-            # for future in futures:
-            #     future.result()
-
-            # format_string = "".join(format_char for _, format_char in data_enc)
-            # record_size = calculate_bytes_of_record(format_string)
-            # num_records = len(raw_data) // record_size
-
-            # worker_jobs = distribute_jobs(
-            #     num_jobs=num_records, num_workers=self.num_worker
-            # )
-
-            # print(data_enc)
-
-            # unpacked_data = sample_data_decode(data_enc=data_enc, raw_data=raw_data)
-            # print(unpacked_data[:2])
-
-            # if data_enc == "list":
-            #     continue
-
-            # if unit == "ms":
-            #     timestamps, miliseconds = compute_sample_periods_unit_ms(
-            #         data_decoded=unpacked_data,
-            #         measured_timestamp=measured_timestamp,
-            #     )
-            # else:
-            #     timestamps, miliseconds = compute_sample_periods(
-            #         sample_rate=sample_rate,
-            #         measured_timestamp=measured_timestamp,
-            #         total_values=total_values,
-            #     )
-
-            # all_data = zip(timestamps, miliseconds, unpacked_data)
-
-            # format_string = "".join(format_char for _, format_char in data_enc)
-            # record_size = calculate_bytes_of_record(format_string)
-            # if record_size != 12:
-            #     continue
-            # with open("../../output.txt", "w") as file:
-            #     for timestamps, miliseconds, unpacked_data in all_data:
-            #         file.write(
-            #             "%s %s %s\n"
-            #             % (
-            #                 timestamps,
-            #                 float_to_string(miliseconds),
-            #                 data_fromat(unpacked_data),
-            #             )
-            #         )
-
-            # print(data_enc)
-            # print(format_string)
-            # print(record_size)
-            # print(worker_jobs)
+        try:
+            header = [
+                "Timestamp",
+                "Milliseconds",
+                "FileName",
+                "SensorType",
+                "Channel",
+                "Data",
+            ]
+            CSV_file, counting_file = open_output_file(
+                data_path, binary=self.compression is not None, newline=""
+            )
+            with CSV_file:
+                if self.compression is not None:
+                    # The header row is one more compressed stream in front of the channel files
+                    header_text = StringIO()
+                    csv_writer(header_text).writerow(header)
+                    CSV_file.write(
+                        compress_block(
+                            header_text.getvalue().encode(), self.compression
+                        )
+                    )
+                else:
+                    csvwriter = csv_writer(CSV_file)
+                    # Write CSV headers
+                    csvwriter.writerow(header)
+            # Append the channel CSV files in large binary blocks, they are never loaded into memory
+            part_names = [f"{part_name}.csv{suffix}" for part_name in self.part_names]
+            part_paths = [
+                f"{self.path_save_data}/{part_name}" for part_name in part_names
+            ]
+            append_files(destination_path=data_path, source_paths=part_paths)
+            # The checksum of data.csv follows from the checksums of the channel CSV files
+            checksums = [
+                self.manifest.get_file_checksum(channel_label, part_name)
+                for channel_label, part_name in zip(self.part_names, part_names)
+            ]
+            if all(checksum is not None for checksum in checksums):
+                self.manifest.set_data_csv(
+                    channel_labels=self.part_names,
+                    file_name=f"data.csv{suffix}",
+                    checksum=combine_checksums([counting_file.checksum(), *checksums]),
+                )
+            # Channel CSV files were only needed to build data.csv
+            if not self.keep_channel_csv:
+                for channel_label, part_name, part_path in zip(
+                    self.part_names, part_names, part_paths
+                ):
+                    os_remove(part_path)
+                    self.manifest.remove_channel_files(channel_label, [part_name])
+            self.manifest.save()
+            on_event({"task_id": "write_data.csv", "message": f"{data_path} - saved"})
+            return True
 
+        except:
+            on_event(
+                {
+                    "task_id": "write_data.csv",
+                    "message": f"data.csv - {FileWriteError}",
+                }
+            )
+            return False
+
+    # Read channel data contained in KDF files.
+    # on_progress receives ProgressTracker.snapshot() while the workers run.
+    # control pauses, resumes or cancels the workers, after a cancellation the channels that
+    # were done are kept and calling get_channel_data again only extracts the others
+    def get_channel_data(
+        self,
+        on_event: callable,
+        on_succes: callable,
+        on_progress: Optional[callable] = None,
+        control: Optional[ExtractionControl] = None,
+        pool: Optional[WorkerPool] = None,
+    ):
+        tasks = self.plan_tasks()
+        self.report_resumed_channels(on_event=on_event)
+        # Task ids of run_extraction_tasks start with the index of the file
+        for kwargs in tasks:
+            kwargs["task_id"] = (0, kwargs["task_id"])
+        self.cancelled = run_extraction_tasks(
+            extractors=[self],
+            tasks=tasks,
+            on_event=on_event,
+            on_file_done=lambda file_index: None,
+            on_progress=on_progress,
+            control=control,
+            pool=pool,
+            num_worker=self.num_worker,
+            memory_limit=self.memory_limit,
+            use_mmap=self.use_mmap,
+        )
+        if self.cancelled:
+            on_event({"task_id": None, "message": "Extraction cancelled"})
+            return
+
+        self.failed = not self.write_data_csv(on_event=on_event)
+
+        on_succes()
+
+        if self.failed:
+            on_event({"task_id": None, "message": "Extraction finished with errors"})
+            return
         on_event({"task_id": None, "message": "Extracted files successfully"})
 
 
-if __name__ == "__main__":
-    KDF_file_path = "../../test1.kdf"
-    path_save_data = "../../out"
-    on_event = lambda event: print(event)
-    on_succes = lambda event: print(event)
-    kdf_extractor = KDFExtractor(
-        KDF_file_path=KDF_file_path,
-        path_save_data=path_save_data,
-        num_worker=4,
-    )
-
-    print(kdf_extractor)
-
-    import time
+# Run the tasks of one or more KDF files on the workers and pass the events of the workers to
+# the extractor of their file, task ids are (index of the file in extractors, task id).
+# on_file_done(file_index) is called once every task of a file ended, not after a
+# cancellation (data.csv of a cancelled file is written when the extraction is resumed).
+# Returns True when the extraction was cancelled
+def run_extraction_tasks(
+    extractors: list[Optional[KDFExtractor]],
+    tasks: list[Dict[str, any]],
+    on_event: callable,
+    on_file_done: callable,
+    on_progress: Optional[callable] = None,
+    control: Optional[ExtractionControl] = None,
+    pool: Optional[WorkerPool] = None,
+    num_worker: Optional[int] = None,
+    memory_limit: Optional[int] = None,
+    use_mmap: bool = True,
+) -> bool:
+    pending_files = {
+        file_index
+        for file_index, extractor in enumerate(extractors)
+        if extractor is not None and len(extractor.task_ids) != 0
+    }
+    progress_tracker = ProgressTracker()
+    progress_tracker.add_tasks(tasks)
+
+    # Create a pipe to communicate between main process and child process
+    parent_pipe, child_pipe = Pipe()
+    with open_worker_pool(
+        num_worker=num_worker or get_default_num_worker(len(tasks)),
+        control=control,
+        pool=pool,
+    ) as (submit, control):
+        # Largest channels of all files first, small channels fill the gaps at the end.
+        # Tasks that do not fit in the memory limit are submitted when running ones end
+        scheduler = TaskScheduler(
+            tasks=tasks,
+            submit=lambda **kwargs: submit(
+                worker_KDF_extract, pipe=child_pipe, **kwargs
+            ),
+            memory_limit=resolve_memory_limit(memory_limit),
+            prepare_task=(
+                None
+                if use_mmap
+                else lambda kwargs: extractors[kwargs["task_id"][0]].read_task_data(
+                    kwargs
+                )
+            ),
+        )
+
+        # (task_id, part_index) of the parts that ended, a part whose future failed after it
+        # sent "end" is not ended twice
+        ended_parts = set()
+
+        # A part of a task ended, files are the checksums the worker sent with "end"
+        def end_task(task_id: tuple[int, any], files: Optional[Dict] = None):
+            scheduler.on_task_end(task_id)
+            file_index, file_task_id = task_id
+            extractor = extractors[file_index]
+            all_done = extractor.on_task_end(
+                task_id=file_task_id, on_event=on_event, files=files
+            )
+            if (
+                file_task_id not in extractor.task_ids
+                and file_task_id not in extractor.cancelled_task_ids
+            ):
+                progress_tracker.finish_task(task_id)
+            if on_progress is not None:
+                on_progress(progress_tracker.snapshot())
+            if all_done:
+                pending_files.discard(file_index)
+                if not control.is_cancelled():
+                    on_file_done(file_index)
+
+        scheduler.submit_ready()
+
+        # Listen for events emitted from the child process and emit them out through the callback function
+        cancelled = False
+        while len(pending_files) != 0:
+            if control.is_cancelled() and not cancelled:
+                cancelled = True
+                # Running tasks stop at their next chunk, the others are dropped
+                for file_index, task_id in [
+                    *scheduler.drop_pending_tasks(),
+                    *cancel_pending_futures(scheduler.futures),
+                ]:
+                    extractors[file_index].cancelled_task_ids.add(task_id)
+                    end_task((file_index, task_id))
+                continue
+            # A worker that died (killed, out of memory, crashed) never sends "end"
+            for task_id, part_index, error in scheduler.pop_failed_tasks():
+                if (task_id, part_index) in ended_parts:
+                    continue
+                ended_parts.add((task_id, part_index))
+                file_index, file_task_id = task_id
+                extractor = extractors[file_index]
+                on_event(
+                    {
+                        "task_id": task_id,
+                        "message": f"{extractor.task_labels[file_task_id]} - {error!r}",
+                    }
+                )
+                extractor.failed_task_ids.add(file_task_id)
+                end_task(task_id)
+            if not parent_pipe.poll(CONTROL_POLL_INTERVAL):
+                # Every worker ended and every message was read, the tasks left will never end
+                if scheduler.is_idle() and not parent_pipe.poll():
+                    for file_index in list(pending_files):
+                        extractor = extractors[file_index]
+                        for file_task_id, num_parts in list(extractor.task_ids.items()):
+                            extractor.failed_task_ids.add(file_task_id)
+                            for _ in range(num_parts):
+                                end_task((file_index, file_task_id))
+                continue
+            event = parent_pipe.recv()
+            if event["message"] == "progress":
+                progress_tracker.update(event)
+                if on_progress is not None:
+                    on_progress(progress_tracker.snapshot())
+            elif event["message"] == "cancelled":
+                file_index, task_id = event["task_id"]
+                extractors[file_index].cancelled_task_ids.add(task_id)
+            elif event["message"] == "failed":
+                file_index, task_id = event["task_id"]
+                extractors[file_index].failed_task_ids.add(task_id)
+            elif event["message"] == "end":
+                part = (event["task_id"], event.get("part_index", None))
+                if part not in ended_parts:
+                    ended_parts.add(part)
+                    end_task(event["task_id"], files=event.get("files"))
+            else:
+                on_event(event)
+
+        # Close the stream, no more events will be emitted
+        child_pipe.close()
+        parent_pipe.close()
+
+    return cancelled or control.is_cancelled()
 
-    start_time = time.time()
 
-    print(kdf_extractor.get_channel_data(on_event=on_event, on_succes=on_succes))
+if __name__ == "__main__":
+    from .cli import main
 
-    end_time = time.time()
-    single_time = end_time - start_time
-    print("Thời gian thực thi:", single_time)
+    main()
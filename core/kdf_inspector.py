@@ -0,0 +1,230 @@
+# Read the header of KDF files without extracting anything, used to list channels and plan work
+from dataclasses import dataclass, field
+from json import loads as json_loads
+from os import stat as os_stat
+from os.path import abspath as os_abspath
+from typing import BinaryIO, Dict, Optional
+
+from msgpack import unpackb as msgpack_unpackb
+
+from .exceptions import HeaderNotFoundError, ParserDataError
+from .utils import (
+    NPY_COLUMNS,
+    calculate_bytes_of_record,
+    count_sample_periods,
+    float_to_string,
+    np_dtype,
+    np_frombuffer,
+)
+
+# 7 bytes format identifier, 3 bytes format version, 4 bytes header size (uint32, little endian)
+KDF_PREAMBLE_SIZE = 14
+
+# Average number of characters of one "%f" value, e.g. "-123.456789", used for size estimates
+AVERAGE_VALUE_CHARS = 11
+# Size of the header of a .npy file written by numpy (version 1.0)
+NPY_HEADER_SIZE = 128
+# Length of a timestamp column value, e.g. "2024-03-12T19:13:27.000"
+TIMESTAMP_CHARS = 23
+
+# Inspected files by absolute path, an entry is used as long as the size and mtime of the file match
+KDF_INFO_CACHE: Dict[str, "KDFFileInfo"] = {}
+
+
+@dataclass(frozen=True)
+class ChannelInfo:
+    # Position of the channel in the header, also the task id used by the extractor
+    index: int
+    label: str
+    type: str
+    # e.g. [["x", "f"], ["y", "f"]] or "list"
+    data_enc: list | str
+    unit: str
+    sample_rate: float
+    total_values: int
+    data_size: int
+    # Position of the channel data in the KDF file
+    data_offset: int
+    # Bytes of one record, 0 for list channels
+    record_size: int
+
+    # Number of rows written for the channel
+    @property
+    def num_records(self) -> int:
+        if self.record_size == 0:
+            return self.total_values
+        return self.data_size // self.record_size
+
+    # Last value of the milliseconds column, None when it is not known without decoding the data
+    @property
+    def duration_ms(self) -> Optional[float]:
+        if self.data_enc == "list" or self.unit == "ms" or not self.sample_rate:
+            return None
+        num_values = count_sample_periods(
+            sample_rate=self.sample_rate, total_values=self.total_values
+        )
+        return (num_values - 1) * (1000 / self.sample_rate) if num_values != 0 else 0
+
+    # Approximate size in bytes of each file written for the channel, the text formats
+    # assume AVERAGE_VALUE_CHARS characters per value
+    def estimate_output_sizes(
+        self, file_name: str, formats: tuple[str, ...]
+    ) -> Dict[str, int]:
+        num_records = self.num_records
+        if self.data_enc == "list":
+            # 'N/A' columns and the JSON text of each event
+            data_chars = self.data_size // max(num_records, 1)
+            timestamp_chars = miliseconds_chars = 3
+        else:
+            data_chars = len(self.data_enc) * (AVERAGE_VALUE_CHARS + 1) - 1
+            timestamp_chars = TIMESTAMP_CHARS
+            miliseconds_chars = len(float_to_string(self.duration_ms or 0))
+        channel_data_chars = len(f"{file_name}/{self.type}/{self.label}")
+        sizes = {}
+        if "txt" in formats:
+            sizes["txt"] = num_records * (
+                timestamp_chars
+                + miliseconds_chars
+                + channel_data_chars
+                + data_chars
+                + 4
+            )
+        if "csv" in formats:
+            sizes["csv"] = num_records * (
+                timestamp_chars
+                + miliseconds_chars
+                + channel_data_chars
+                + data_chars
+                + 5
+            )
+        if "npy" in formats:
+            sizes["npy"] = NPY_HEADER_SIZE + self.data_size
+            if self.data_enc != "list":
+                # timestamps (datetime64[ms]) and miliseconds (float64) columns
+                sizes["npy"] += (len(NPY_COLUMNS) - 1) * (
+                    NPY_HEADER_SIZE + 8 * num_records
+                )
+        return sizes
+
+
+@dataclass(frozen=True)
+class KDFFileInfo:
+    KDF_file_path: str
+    # "KDFJSON" or "KDFMSGP"
+    file_format: str
+    version: str
+    header_size: int
+    header: Dict[str, any] = field(repr=False)
+    channels: tuple[ChannelInfo, ...]
+    # Signature of the file when it was inspected
+    file_size: int
+    mtime_ns: int
+
+    @property
+    def measured_timestamp(self) -> Optional[str]:
+        return self.header.get("measured_timestamp", None)
+
+    @property
+    def data_size(self) -> int:
+        return sum(channel.data_size for channel in self.channels)
+
+    def get_channel(self, label: str) -> Optional[ChannelInfo]:
+        for channel in self.channels:
+            if channel.label == label:
+                return channel
+        return None
+
+
+# Read the preamble and the header of an open KDF file, returns (file_format, version, header_size, header)
+def read_KDF_header(KDF_file: BinaryIO) -> tuple[str, str, int, Dict[str, any]]:
+    try:
+        KDF_file.seek(0)
+        preamble = KDF_file.read(KDF_PREAMBLE_SIZE)
+        file_format = preamble[:7].decode("ascii")
+        version = preamble[7:10].decode("ascii")
+        header_size = int(
+            np_frombuffer(preamble[10:14], dtype=np_dtype("<I"), count=1)[0]
+        )
+        header_data = KDF_file.read(header_size)
+
+        if file_format == "KDFJSON":
+            header = json_loads(header_data)
+        elif file_format == "KDFMSGP":
+            header = msgpack_unpackb(header_data, raw=False)
+        else:
+            raise HeaderNotFoundError
+        if not isinstance(header, dict):
+            raise HeaderNotFoundError
+    except:
+        raise HeaderNotFoundError
+    return file_format, version, header_size, header
+
+
+# Build the channel descriptors of a parsed header
+def get_channel_infos(header: Dict[str, any], header_size: int) -> list[ChannelInfo]:
+    channels = header.get("channels", None)
+    if channels is None:
+        raise HeaderNotFoundError
+
+    channel_infos = []
+    for index, channel in enumerate(channels):
+        data_enc = channel["data_enc"]
+        # Parser data_size and data_offset to int
+        try:
+            data_size = int(channel["data_size"])
+            data_url = int(channel["data_url"])
+        except:
+            raise ParserDataError
+        record_size = 0
+        if data_enc != "list":
+            record_size = calculate_bytes_of_record(
+                "".join(format_char for _, format_char in data_enc)
+            )
+        channel_infos.append(
+            ChannelInfo(
+                index=index,
+                label=channel["label"],
+                type=channel["type"],
+                data_enc=data_enc,
+                unit=channel.get("unit", ""),
+                sample_rate=channel.get("sample_rate", 0),
+                total_values=channel.get("total_values", 0),
+                data_size=data_size,
+                data_offset=header_size + KDF_PREAMBLE_SIZE + data_url,
+                record_size=record_size,
+            )
+        )
+    return channel_infos
+
+
+# Parse only the header of the KDF file, no output folder is created and no file handle is kept open.
+# Results are cached until the size or modification time of the file changes
+def inspect_KDF_file(KDF_file_path: str) -> KDFFileInfo:
+    cache_key = os_abspath(KDF_file_path)
+    try:
+        file_stat = os_stat(KDF_file_path)
+    except OSError:
+        raise HeaderNotFoundError
+
+    KDF_info = KDF_INFO_CACHE.get(cache_key, None)
+    if (
+        KDF_info is not None
+        and KDF_info.file_size == file_stat.st_size
+        and KDF_info.mtime_ns == file_stat.st_mtime_ns
+    ):
+        return KDF_info
+
+    with open(KDF_file_path, "rb") as KDF_file:
+        file_format, version, header_size, header = read_KDF_header(KDF_file)
+    KDF_info = KDFFileInfo(
+        KDF_file_path=KDF_file_path,
+        file_format=file_format,
+        version=version,
+        header_size=header_size,
+        header=header,
+        channels=tuple(get_channel_infos(header=header, header_size=header_size)),
+        file_size=file_stat.st_size,
+        mtime_ns=file_stat.st_mtime_ns,
+    )
+    KDF_INFO_CACHE[cache_key] = KDF_info
+    return KDF_info
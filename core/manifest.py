@@ -0,0 +1,134 @@
+# Completion manifest of the files extracted from one KDF file. A re-run reads it and only
+# extracts the channels whose files are missing or changed since they were written
+from dataclasses import dataclass, field
+from json import dump as json_dump
+from json import load as json_load
+from os import replace as os_replace
+from os.path import getsize as os_getsize
+from os.path import join as os_join
+from typing import Dict, Optional
+
+from .utils import file_crc32
+
+MANIFEST_FILE_NAME = "manifest.json"
+# Increased when the layout of the manifest changes, older manifests are ignored
+MANIFEST_VERSION = 1
+
+
+@dataclass
+class ExtractionManifest:
+    # Folder of the extracted files, the manifest is saved in it
+    path_save_data: str
+    # Version, signature of the KDF file and the options that change the content of the files
+    source: Dict[str, any]
+    # By channel label: formats written and the size and CRC-32 of each file (by file name).
+    # Channel CSV files deleted once data.csv was built are moved to "removed_files"
+    channels: Dict[str, Dict[str, any]] = field(default_factory=dict)
+    # Channel labels data.csv was built from and the size and CRC-32 of data.csv
+    data_csv: Optional[Dict[str, any]] = field(default=None)
+
+    @property
+    def manifest_path(self) -> str:
+        return os_join(self.path_save_data, MANIFEST_FILE_NAME)
+
+    # Check that the files (by file name) did not change since they were recorded
+    def are_files_unchanged(self, files: Dict[str, Dict[str, any]]) -> bool:
+        try:
+            return all(
+                os_getsize(os_join(self.path_save_data, file_name)) == file["size"]
+                and file_crc32(os_join(self.path_save_data, file_name)) == file["crc32"]
+                for file_name, file in files.items()
+            )
+        except OSError:
+            return False
+
+    # Check that the channel was written in every format and its files did not change since.
+    # A channel whose CSV file was deleted after data.csv was built is only complete with
+    # allow_removed, while the data.csv built from it is complete as well
+    def is_channel_complete(
+        self, channel_label: str, formats: tuple[str, ...], allow_removed: bool = False
+    ) -> bool:
+        channel = self.channels.get(channel_label, None)
+        if channel is None or not set(formats) <= set(channel["formats"]):
+            return False
+        if len(channel.get("removed_files", {})) != 0 and not allow_removed:
+            return False
+        return self.are_files_unchanged(channel["files"])
+
+    # Record the files of a channel that was written completely, files are the size and
+    # CRC-32 of each file (by file name) computed while it was written
+    def add_channel(
+        self,
+        channel_label: str,
+        formats: tuple[str, ...],
+        files: Dict[str, Dict[str, any]],
+    ):
+        self.channels[channel_label] = {"formats": list(formats), "files": dict(files)}
+
+    def remove_channel(self, channel_label: str):
+        self.channels.pop(channel_label, None)
+        # data.csv is built again from the new files of the channel
+        self.data_csv = None
+
+    # The files were deleted on purpose, the channel is still complete for data.csv
+    def remove_channel_files(self, channel_label: str, file_names: list[str]):
+        channel = self.channels.get(channel_label, None)
+        if channel is None:
+            return
+        removed_files = channel.setdefault("removed_files", {})
+        for file_name in file_names:
+            if file_name in channel["files"]:
+                removed_files[file_name] = channel["files"].pop(file_name)
+
+    # Size and CRC-32 of the file file_name of the channel, None when it is not recorded
+    def get_file_checksum(
+        self, channel_label: str, file_name: str
+    ) -> Optional[Dict[str, any]]:
+        return self.channels.get(channel_label, {}).get("files", {}).get(file_name)
+
+    def set_data_csv(
+        self, channel_labels: list[str], file_name: str, checksum: Dict[str, any]
+    ):
+        self.data_csv = {
+            "channels": list(channel_labels),
+            "files": {file_name: checksum},
+        }
+
+    # Check that data.csv was built from the same channels and did not change since
+    def is_data_csv_complete(self, channel_labels: list[str]) -> bool:
+        return (
+            self.data_csv is not None
+            and self.data_csv["channels"] == list(channel_labels)
+            and self.are_files_unchanged(self.data_csv["files"])
+        )
+
+    # Written to a temporary file first, an interrupted save never leaves a broken manifest
+    def save(self):
+        temporary_path = f"{self.manifest_path}.tmp"
+        with open(temporary_path, "w") as manifest_file:
+            json_dump(
+                {
+                    "source": self.source,
+                    "channels": self.channels,
+                    "data_csv": self.data_csv,
+                },
+                manifest_file,
+                indent=2,
+            )
+        os_replace(temporary_path, self.manifest_path)
+
+
+# Load the manifest saved in path_save_data. Without a manifest, or when it was written for
+# another version of the KDF file or other options, no channel is complete
+def load_manifest(path_save_data: str, source: Dict[str, any]) -> ExtractionManifest:
+    source = {"version": MANIFEST_VERSION, **source}
+    manifest = ExtractionManifest(path_save_data=path_save_data, source=source)
+    try:
+        with open(manifest.manifest_path) as manifest_file:
+            saved_manifest = json_load(manifest_file)
+        if saved_manifest["source"] == source:
+            manifest.channels = dict(saved_manifest["channels"])
+            manifest.data_csv = saved_manifest.get("data_csv", None)
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return manifest
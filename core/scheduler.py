@@ -0,0 +1,223 @@
+# Size the worker pool from the CPUs and the available memory, and submit the worker tasks
+# largest first without letting the running tasks use more memory than the limit
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from os import cpu_count as os_cpu_count
+from sys import platform as sys_platform
+from typing import Dict, Optional
+
+from .utils import FORMAT_CHUNK_ROWS, WRITE_QUEUE_DEPTH, sort_tasks_by_size
+
+# psutil is optional, without it the memory is read from /proc/meminfo, sysconf or the Windows API
+try:
+    from psutil import virtual_memory as psutil_virtual_memory
+except ImportError:
+    psutil_virtual_memory = None
+
+# Memory of an idle worker process (Python, numpy and msgpack)
+WORKER_PROCESS_MEMORY = 100 * 1024 * 1024
+# Fraction of the available memory the running tasks may use when no limit is given
+MEMORY_LIMIT_FRACTION = 0.5
+# Bytes of one text row while it is formatted (strings of every column and the joined line)
+TEXT_ROW_MEMORY = 400
+# Formatted strings of JSON/msgpack events, several times the size of their bytes
+LIST_STRING_FACTOR = 4
+# Bytes per row of the timestamps (datetime64) and miliseconds (float64) columns kept for .npy files
+NPY_TIMESTAMP_ROW_MEMORY = 16
+
+
+# Bytes of memory that can be used without swapping, None when it cannot be found out
+def get_available_memory() -> Optional[int]:
+    if psutil_virtual_memory is not None:
+        return int(psutil_virtual_memory().available)
+    if sys_platform.startswith("linux"):
+        try:
+            with open("/proc/meminfo") as meminfo:
+                for line in meminfo:
+                    if line.startswith("MemAvailable:"):
+                        return int(line.split()[1]) * 1024
+        except (OSError, ValueError, IndexError):
+            pass
+    if sys_platform == "win32":
+        return get_windows_available_memory()
+    try:
+        from os import sysconf as os_sysconf
+
+        return os_sysconf("SC_AVPHYS_PAGES") * os_sysconf("SC_PAGE_SIZE")
+    except (ImportError, ValueError, OSError):
+        return None
+
+
+# GlobalMemoryStatusEx of kernel32, used on Windows when psutil is not installed
+def get_windows_available_memory() -> Optional[int]:
+    try:
+        from ctypes import Structure, byref, c_ulong, c_ulonglong, sizeof, windll
+
+        class MEMORYSTATUSEX(Structure):
+            _fields_ = [
+                ("dwLength", c_ulong),
+                ("dwMemoryLoad", c_ulong),
+                ("ullTotalPhys", c_ulonglong),
+                ("ullAvailPhys", c_ulonglong),
+                ("ullTotalPageFile", c_ulonglong),
+                ("ullAvailPageFile", c_ulonglong),
+                ("ullTotalVirtual", c_ulonglong),
+                ("ullAvailVirtual", c_ulonglong),
+                ("ullAvailExtendedVirtual", c_ulonglong),
+            ]
+
+        memory_status = MEMORYSTATUSEX()
+        memory_status.dwLength = sizeof(MEMORYSTATUSEX)
+        if not windll.kernel32.GlobalMemoryStatusEx(byref(memory_status)):
+            return None
+        return int(memory_status.ullAvailPhys)
+    except (ImportError, AttributeError, OSError):
+        return None
+
+
+# Bytes the running tasks may use together, None when there is no limit
+def get_default_memory_limit() -> Optional[int]:
+    available_memory = get_available_memory()
+    if available_memory is None:
+        return None
+    return int(available_memory * MEMORY_LIMIT_FRACTION)
+
+
+# memory_limit of the extractors: None is the default limit, 0 means no limit
+def resolve_memory_limit(memory_limit: Optional[int]) -> Optional[int]:
+    if memory_limit is None:
+        return get_default_memory_limit()
+    if memory_limit == 0:
+        return None
+    return memory_limit
+
+
+# One worker per CPU, as long as every worker process fits in the available memory.
+# A pool is never larger than the number of tasks it runs
+def get_default_num_worker(num_tasks: Optional[int] = None) -> int:
+    num_worker = os_cpu_count() or 1
+    available_memory = get_available_memory()
+    if available_memory is not None:
+        num_worker = min(num_worker, available_memory // WORKER_PROCESS_MEMORY)
+    if num_tasks is not None:
+        num_worker = min(num_worker, num_tasks)
+    return max(1, num_worker)
+
+
+# Approximate peak memory of one worker task (keyword arguments of worker_KDF_extract).
+# read_by_main: the main process reads the data of the task and sends it to the worker
+def estimate_task_memory(kwargs: Dict[str, any], read_by_main: bool = False) -> int:
+    data_size = int(kwargs["data_size"])
+    if kwargs["data_enc"] == "list":
+        # Events are decoded block by block while they are written, only the data sent by the
+        # main process is kept whole. The strings of every event are kept for a .npy file
+        memory = data_size if read_by_main else 0
+        if "npy" in kwargs.get("formats", ()):
+            memory += data_size * LIST_STRING_FACTOR
+        return memory + FORMAT_CHUNK_ROWS * TEXT_ROW_MEMORY
+    record_range = kwargs.get("record_range", None)
+    num_rows = (
+        record_range[1] - record_range[0]
+        if record_range is not None
+        else int(kwargs["total_values"])
+    )
+    # Decoded samples, plus the bytes sent by the main process when the worker does not map the file
+    memory = data_size * (2 if read_by_main else 1)
+    if "npy" in kwargs.get("formats", ()):
+        memory += num_rows * NPY_TIMESTAMP_ROW_MEMORY
+    # Chunks formatted or waiting for the writer thread
+    memory += min(num_rows, FORMAT_CHUNK_ROWS * (WRITE_QUEUE_DEPTH + 2)) * (
+        TEXT_ROW_MEMORY
+    )
+    return memory
+
+
+# Submits the tasks largest first while their estimated memory fits in memory_limit,
+# the other tasks are submitted when running ones end
+@dataclass
+class TaskScheduler:
+    # Keyword arguments of worker_KDF_extract (without the pipe)
+    tasks: list[Dict[str, any]]
+    # submit(**kwargs) -> Future
+    submit: callable
+    # None submits every task at once
+    memory_limit: Optional[int] = field(default=None)
+    # Called with the kwargs of a task just before it is submitted, reads the data of the
+    # task when the workers do not map the KDF file
+    prepare_task: Optional[callable] = field(default=None)
+    # (task_id, future) of every submitted task that did not end yet
+    futures: list[tuple[any, Future]] = field(default_factory=list, init=False)
+    # part_index of the task of each future, identifies the part of a split channel
+    future_parts: Dict[Future, Optional[int]] = field(default_factory=dict, init=False)
+    pending_tasks: list[Dict[str, any]] = field(default_factory=list, init=False)
+    # Estimated memory of the submitted parts of each task id
+    task_memory: Dict[any, list[int]] = field(default_factory=dict, init=False)
+    memory_in_flight: int = field(default=0, init=False)
+
+    def __post_init__(self):
+        self.pending_tasks = sort_tasks_by_size(self.tasks)
+
+    # Submit every pending task that fits, the largest that fit first.
+    # One task always runs, even if it is larger than the limit on its own
+    def submit_ready(self):
+        index = 0
+        while index < len(self.pending_tasks):
+            kwargs = self.pending_tasks[index]
+            memory = estimate_task_memory(
+                kwargs, read_by_main=self.prepare_task is not None
+            )
+            if (
+                self.memory_limit is not None
+                and self.memory_in_flight != 0
+                and self.memory_in_flight + memory > self.memory_limit
+            ):
+                index += 1
+                continue
+            self.pending_tasks.pop(index)
+            if self.prepare_task is not None:
+                self.prepare_task(kwargs)
+            self.task_memory.setdefault(kwargs["task_id"], []).append(memory)
+            self.memory_in_flight += memory
+            try:
+                future = self.submit(**kwargs)
+            except Exception as e:
+                # The pool broke (a worker died), the task fails like the ones that were running
+                future = Future()
+                future.set_exception(e)
+            self.future_parts[future] = kwargs.get("part_index", None)
+            self.futures.append((kwargs["task_id"], future))
+
+    # A part of the task ended (the "end" event does not say which one, parts have about the same size)
+    def on_task_end(self, task_id: any):
+        memory = self.task_memory.get(task_id, [])
+        if len(memory) != 0:
+            self.memory_in_flight -= memory.pop()
+        self.submit_ready()
+
+    # Drop the futures that ended and return (task_id, part_index, error) of the ones that
+    # ended with an error: the worker process died (killed, out of memory) or the pool broke.
+    # These tasks never send "end"
+    def pop_failed_tasks(self) -> list[tuple[any, Optional[int], BaseException]]:
+        failed_tasks = []
+        running_futures = []
+        for task_id, future in self.futures:
+            if not future.done():
+                running_futures.append((task_id, future))
+                continue
+            part_index = self.future_parts.pop(future)
+            if not future.cancelled() and future.exception() is not None:
+                failed_tasks.append((task_id, part_index, future.exception()))
+        self.futures = running_futures
+        return failed_tasks
+
+    # Every task was submitted and every submitted task ended
+    def is_idle(self) -> bool:
+        return len(self.pending_tasks) == 0 and all(
+            future.done() for _, future in self.futures
+        )
+
+    # Tasks that were never submitted, they are dropped when the extraction is cancelled
+    def drop_pending_tasks(self) -> list[any]:
+        task_ids = [kwargs["task_id"] for kwargs in self.pending_tasks]
+        self.pending_tasks = []
+        return task_ids
@@ -1,28 +1,136 @@
-def read_and_filter_time_codes(file_path, start_time, end_time):
+from bisect import bisect_left
+from json import dump as json_dump
+from json import load as json_load
+from os import stat as os_stat
+
+# Number of data lines between two entries of the time code index
+INDEX_STRIDE = 1024
+# Increase when the layout of the index file changes, older index files are rebuilt
+INDEX_VERSION = 1
+
+
+# The index is saved next to the txt file, e.g. PPG.txt -> PPG.txt.idx
+def get_index_path(file_path: str) -> str:
+    return f"{file_path}.idx"
+
+
+# Size and modification time of the txt file, used to detect a stale index
+def get_file_signature(file_path: str) -> dict:
+    file_stat = os_stat(file_path)
+    return {"size": file_stat.st_size, "mtime_ns": file_stat.st_mtime_ns}
+
+
+# Scan the txt file once and save the byte offset of every INDEX_STRIDE-th data line with its time code
+def build_time_code_index(file_path: str) -> dict:
+    time_codes = []
+    offsets = []
+    is_sorted = True
+    last_time_code = None
+    line_number = 0
+    offset = 0
+    with open(file_path, "rb") as file:
+        for line in file:
+            line_offset = offset
+            offset += len(line)
+            line = line.strip()
+            # Same lines as read_and_filter_time_codes, skip empty lines and the header
+            if not line or line.startswith(b"#D"):
+                continue
+            time_code = line.split(b" ")[0].decode()
+            # Binary search needs time codes in order, otherwise the file is always scanned
+            if last_time_code is not None and time_code < last_time_code:
+                is_sorted = False
+                break
+            if line_number % INDEX_STRIDE == 0:
+                time_codes.append(time_code)
+                offsets.append(line_offset)
+            last_time_code = time_code
+            line_number += 1
+
+    index = {
+        "version": INDEX_VERSION,
+        "stride": INDEX_STRIDE,
+        "source": get_file_signature(file_path),
+        "sorted": is_sorted,
+        "time_codes": time_codes if is_sorted else [],
+        "offsets": offsets if is_sorted else [],
+    }
+    try:
+        with open(get_index_path(file_path), "w") as index_file:
+            json_dump(index, index_file)
+    except OSError:
+        # The folder may be read-only, the index is still used for this query
+        pass
+    return index
+
+
+# Load the index of the txt file, build it when it does not exist or the txt file has changed
+def load_time_code_index(file_path: str) -> dict:
+    try:
+        with open(get_index_path(file_path), "r") as index_file:
+            index = json_load(index_file)
+        if (
+            index.get("version") == INDEX_VERSION
+            and index.get("stride") == INDEX_STRIDE
+            and index.get("source") == get_file_signature(file_path)
+        ):
+            return index
+    except (OSError, ValueError):
+        pass
+    return build_time_code_index(file_path)
+
+
+# Byte offset to start reading from so that no line with time code >= start_time is skipped
+def find_start_offset(index: dict, start_time: str) -> int:
+    if not index["sorted"] or len(index["offsets"]) == 0 or not start_time:
+        return 0
+    position = bisect_left(index["time_codes"], start_time)
+    # The first matching line is after the last indexed time code smaller than start_time
+    return index["offsets"][max(position - 1, 0)]
+
+
+# Yield the data lines of the txt file whose time code is between start_time and end_time
+def iter_filtered_time_codes(file_path, start_time, end_time, use_index=True):
+    start_offset = 0
+    if use_index:
+        start_offset = find_start_offset(load_time_code_index(file_path), start_time)
+    with open(file_path, "r") as file:
+        # Jump to the indexed line close to start_time instead of reading the whole beginning of the file
+        file.seek(start_offset)
+        for line in file:
+            # Removes whitespace and newline characters from the beginning and end of the line
+            line = line.strip()
+            # If the line is not empty, perform time code extraction
+            if line and not line.startswith("#D"):
+                time_code = line.split(" ")[0]
+                # compare time code with start_time and end_time
+                if start_time and start_time > time_code:
+                    continue
+                if end_time and end_time < time_code:
+                    break
+                yield line
+
+
+# Header of an exported region, DURATION is the milliseconds of the last line
+def get_region_header(last_line: str, data_len: int) -> list[str]:
+    last_time = last_line.split()[1]
+    return [f"#DURATION {last_time}", f"#DATAPOINTS {data_len}", ""]
+
+
+def read_and_filter_time_codes(file_path, start_time, end_time, use_index=True):
     filtered_time_codes = []
     try:
-        with open(file_path, "r") as file:
-            for line in file:
-                # Removes whitespace and newline characters from the beginning and end of the line
-                line = line.strip()
-                # If the line is not empty, perform time code extraction
-                if line and not line.startswith("#D"):
-                    time_code = line.split(" ")[0]
-                    # compare time code with start_time and end_time
-                    if start_time and start_time > time_code:
-                        continue
-                    if end_time and end_time < time_code:
-                        break
-                    filtered_time_codes.append(line)
+        filtered_time_codes = list(
+            iter_filtered_time_codes(file_path, start_time, end_time, use_index)
+        )
     except FileNotFoundError:
         print("The file does not exist or cannot be opened.")
 
     data_len = len(filtered_time_codes)
     if data_len != 0:
-        last_time = filtered_time_codes[-1].split()[1]
-        filtered_time_codes.insert(0, f"#DURATION {last_time}")
-        filtered_time_codes.insert(1, f"#DATAPOINTS {data_len}")
-        filtered_time_codes.insert(2, "")
+        filtered_time_codes = (
+            get_region_header(filtered_time_codes[-1], data_len) + filtered_time_codes
+        )
     return filtered_time_codes
 
 
@@ -1,24 +1,96 @@
-from asyncio import create_task as asyncio_create_task
-from asyncio import run as asyncio_run
-from asyncio import wait as asyncio_wait
+from codecs import getincrementaldecoder
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
 from csv import writer as csv_writer
 from datetime import datetime
+from functools import partial
+from io import StringIO
+from itertools import count as iter_count
+from itertools import islice, repeat
+from json import JSONDecoder
 from json import loads as json_loads
+from math import ceil, floor
+from mmap import ACCESS_READ as MMAP_ACCESS_READ
+from mmap import ALLOCATIONGRANULARITY as MMAP_ALLOCATIONGRANULARITY
+from mmap import mmap
 from multiprocessing.connection import Connection
+from os import remove as os_remove
+from os.path import basename as os_basename
+from queue import Queue
+from re import compile as re_compile
 from re import sub as re_sub
-from typing import Dict, List
+from threading import Thread
+from typing import Callable, Dict, Iterable, Iterator, List
 
+from msgpack import OutOfData, Unpacker
 from msgpack import unpackb as msgpack_unpackb
 from numpy import arange as np_arange
 from numpy import array as np_array
+from numpy import ascontiguousarray as np_ascontiguousarray
+from numpy import concatenate as np_concatenate
 from numpy import cumsum as np_cumsum
 from numpy import datetime64 as np_datetime64
+from numpy import datetime_as_string as np_datetime_as_string
 from numpy import dtype as np_dtype
+from numpy import empty as np_empty
+from numpy import float64 as np_float64
 from numpy import frombuffer as np_frombuffer
+from numpy import ndarray
+from numpy import save as np_save
+from numpy import searchsorted as np_searchsorted
 from numpy import timedelta64 as np_timedelta64
+from numpy import uint8 as np_uint8
 from numpy import void as np_void
+from numpy.lib.format import dtype_to_descr, write_array_header_1_0
 
-from ..exceptions import FileWriteError
+from ..exceptions import ExtractionCancelledError, FileWriteError
+from .control import (
+    CONTROL_POLL_INTERVAL,
+    ExtractionControl,
+    cancel_pending_futures,
+    check_worker_control,
+    init_worker_control,
+    is_worker_cancelled,
+)
+from .file_io import (
+    COMPRESSION_SUFFIXES,
+    append_files,
+    combine_checksums,
+    compress_block,
+    compression_suffix,
+    file_crc32,
+    open_output_file,
+)
+from .formatter import (
+    FORMAT_CHUNK_ROWS,
+    format_data_column,
+    format_float_column,
+    is_numeric_dtype,
+)
+from .progress import ProgressReporter, ProgressTracker
+
+# Formats the extractor can write, txt/csv are text, npy is a binary NumPy array per column
+EXPORT_FORMATS = ("txt", "csv", "npy")
+TEXT_FORMATS = ("txt", "csv")
+
+# Suffixes of the .npy files written for each channel
+NPY_COLUMNS = {
+    "data": "npy",
+    "timestamps": "timestamps.npy",
+    "miliseconds": "miliseconds.npy",
+}
+
+# Characters that make the csv module quote a field (delimiter, quote char, line terminator)
+CSV_SPECIAL_CHARACTERS = re_compile(r'[,"\r\n]')
+
+# Number of formatted chunks that may wait for the writer thread of write_text_files
+WRITE_QUEUE_DEPTH = 4
+
+# Bytes of a JSON/msgpack list channel given to the decoder at a time
+LIST_DECODE_BLOCK_SIZE = 64 * 1024
+# Whitespace JSON allows between the items of an array, and the separator after an item
+JSON_WHITESPACE = re_compile(r"[ \t\n\r]*")
+JSON_SEPARATOR = re_compile(r"[ \t\n\r]*([,\]])[ \t\n\r]*")
 
 
 # Remove special characters from the name and also replace spaces with underscores.
@@ -30,6 +102,33 @@ def safe_name(string: str) -> str:
     return string
 
 
+# Map a byte range of the KDF file into memory without copying it
+# The returned memoryview keeps the mapping alive, it is released when the last view/array using it is freed
+def map_channel_data(
+    KDF_file_path: str, data_offset: int, data_size: int
+) -> memoryview:
+    if data_size == 0:
+        return memoryview(b"")
+    # The offset of a mapping must be a multiple of ALLOCATIONGRANULARITY
+    map_offset = data_offset - data_offset % MMAP_ALLOCATIONGRANULARITY
+    delta = data_offset - map_offset
+    with open(KDF_file_path, "rb") as KDF_file:
+        mapped_file = mmap(
+            KDF_file.fileno(),
+            length=delta + data_size,
+            access=MMAP_ACCESS_READ,
+            offset=map_offset,
+        )
+    return memoryview(mapped_file)[delta : delta + data_size]
+
+
+# Read a byte range of the KDF file, used when the workers do not map the file themselves
+def read_channel_data(KDF_file_path: str, data_offset: int, data_size: int) -> bytes:
+    with open(KDF_file_path, "rb") as KDF_file:
+        KDF_file.seek(data_offset)
+        return KDF_file.read(data_size)
+
+
 # Decode encoded data with list type
 def list_decode_data(raw_data: str) -> Dict | List:
     if raw_data.startswith(b"{"):
@@ -40,6 +139,92 @@ def list_decode_data(raw_data: str) -> Dict | List:
         return msgpack_unpackb(raw_data, raw=False)
 
 
+# Items of a JSON array up to its closing "]", the data is decoded block by block. Only the
+# text that is not decoded yet is kept, an item cut by the end of a block is decoded again
+# with the next one
+def iter_JSON_array(raw_data: bytes) -> Iterator[any]:
+    raw_decode = JSONDecoder().raw_decode
+    utf8_decode = getincrementaldecoder("utf-8")().decode
+    blocks = (
+        raw_data[start : start + LIST_DECODE_BLOCK_SIZE]
+        for start in range(0, len(raw_data), LIST_DECODE_BLOCK_SIZE)
+    )
+    text = utf8_decode(next(blocks, b""))
+    # Skip the "[" of the array, only the first item may be the "]" of an empty array
+    index = 1
+    is_first_item = True
+    while True:
+        while True:
+            index = JSON_WHITESPACE.match(text, index).end()
+            if is_first_item and text.startswith("]", index):
+                return
+            try:
+                item, end = raw_decode(text, index)
+                # A number at the end of the text may go on in the next block
+                separator = JSON_SEPARATOR.match(text, end)
+            except ValueError:
+                separator = None
+            if separator is not None:
+                break
+            block = next(blocks, None)
+            if block is None:
+                raise ValueError("Decode failed: incomplete JSON array")
+            text = text[index:] + utf8_decode(block)
+            index = 0
+        yield item
+        if separator.group(1) == "]":
+            return
+        index = separator.end()
+        is_first_item = False
+
+
+# Objects of a msgpack array, the data is decoded block by block
+def iter_msgpack_array(raw_data: bytes, num_items: int) -> Iterator[any]:
+    unpacker = Unpacker(raw=False)
+    blocks = (
+        raw_data[start : start + LIST_DECODE_BLOCK_SIZE]
+        for start in range(0, len(raw_data), LIST_DECODE_BLOCK_SIZE)
+    )
+    unpacker.feed(next(blocks))
+    unpacker.read_array_header()
+    for _ in range(num_items):
+        while True:
+            try:
+                item = unpacker.unpack()
+                break
+            except OutOfData:
+                block = next(blocks, None)
+                if block is None:
+                    raise ValueError("Unpack failed: incomplete input")
+                unpacker.feed(block)
+        yield item
+
+
+# Streaming version of list_decode_data, the events are decoded while they are written.
+# Returns the number of events and an iterator over them, a JSON/msgpack array holds
+# one event per item, any other value is one event. A JSON array does not store its length,
+# the number returned is total_values of the channel header, the iterator yields every item
+# of the array even when the header holds another number
+def iter_list_events(raw_data: bytes, total_values: int) -> tuple[int, Iterator[Dict]]:
+    if raw_data[:1] == b"{":
+        return 1, iter([json_loads(bytes(raw_data))])
+    elif raw_data[:1] == b"[":
+        return total_values, iter_JSON_array(raw_data)
+    # The number of items is in the header of a msgpack array
+    header = Unpacker(raw=False)
+    header.feed(raw_data[:LIST_DECODE_BLOCK_SIZE])
+    try:
+        num_events = header.read_array_header()
+    except (OutOfData, ValueError):
+        return 1, iter([msgpack_unpackb(bytes(raw_data), raw=False)])
+    return num_events, iter_msgpack_array(raw_data, num_events)
+
+
+# Text of one list event, e.g. "label: Sensor connected, len: 0, pos: 938828"
+def format_list_event(event: Dict) -> str:
+    return ", ".join([f"{key}: {value}" for key, value in event.items()])
+
+
 # Calculate the total number of bytes of a record
 def calculate_bytes_of_record(format_string):
     format_size_dict = {
@@ -97,6 +282,15 @@ def distribute_jobs(num_jobs, num_workers):
     return job_ranges
 
 
+# Split the records of a channel into ranges of roughly chunk_size bytes, ranges never cut a record
+def split_channel_records(
+    data_size: int, record_size: int, chunk_size: int
+) -> list[tuple[int, int]]:
+    num_records = data_size // record_size
+    num_parts = max(1, min(num_records, ceil(data_size / max(chunk_size, 1))))
+    return distribute_jobs(num_jobs=num_records, num_workers=num_parts)
+
+
 def parse_date(date_string):
     # New format for time strings containing timezone information
     time_format_new = "%Y-%m-%dT%H:%M:%S%z"
@@ -152,6 +346,72 @@ def compute_sample_periods(
     return [timestamps, miliseconds]
 
 
+# Number of values compute_sample_periods creates (np_arange computes its length the same way)
+def count_sample_periods(sample_rate: int, total_values: int) -> int:
+    sample_period = 1000 / sample_rate
+    return max(0, ceil(total_values * sample_period / sample_period))
+
+
+# Indices [first, last) of the samples whose milliseconds (i * 1000 / sample_rate, the values of
+# compute_sample_periods) are in [start_time, end_time], None leaves that side open
+def find_sample_periods_window(
+    sample_rate: int,
+    num_values: int,
+    start_time: float | None,
+    end_time: float | None,
+) -> tuple[int, int]:
+    sample_period = 1000 / sample_rate
+    first, last = 0, num_values
+    if start_time is not None:
+        first = min(max(0, ceil(start_time / sample_period)), num_values)
+        # The division may round to the neighbouring sample, compare the exact values
+        while first > 0 and (first - 1) * sample_period >= start_time:
+            first -= 1
+        while first < num_values and first * sample_period < start_time:
+            first += 1
+    if end_time is not None:
+        last = min(max(0, floor(end_time / sample_period) + 1), num_values)
+        while last > 0 and (last - 1) * sample_period > end_time:
+            last -= 1
+        while last < num_values and last * sample_period <= end_time:
+            last += 1
+    return first, max(first, last)
+
+
+# Indices [first, last) of the rows of a non-decreasing milliseconds column (cumulative sum of
+# an 'ms' channel) that are in [start_time, end_time], None leaves that side open
+def find_miliseconds_window(
+    miliseconds: ndarray, start_time: float | None, end_time: float | None
+) -> tuple[int, int]:
+    first, last = 0, len(miliseconds)
+    if start_time is not None:
+        first = int(np_searchsorted(miliseconds, start_time, side="left"))
+    if end_time is not None:
+        last = int(np_searchsorted(miliseconds, end_time, side="right"))
+    return first, max(first, last)
+
+
+# Same values as compute_sample_periods, but only for the samples in [start, end)
+def compute_sample_periods_range(
+    sample_rate: int,
+    measured_timestamp: str,
+    start: int,
+    end: int,
+) -> list[list, list]:
+    # The interval between sampling times, measured in ms
+    sample_period = 1000 / sample_rate
+
+    # np_arange fills value i with i * step, so a slice can be computed on its own
+    miliseconds = np_arange(start, end, dtype=np_float64) * sample_period
+
+    # Create an array of timestamps based on milliseconds
+    timestamp_start = datatime_to_timestamp(measured_timestamp)
+    timestamps = timestamp_start + miliseconds
+    timestamps = np_array(timestamps, dtype="datetime64[ms]")
+
+    return [timestamps, miliseconds]
+
+
 def compute_sample_periods_unit_ms(
     data_decoded: list,
     measured_timestamp: str,
@@ -168,10 +428,77 @@ def compute_sample_periods_unit_ms(
     return [timestamps, miliseconds]
 
 
+# Running sum of data_decoded block by block, the same values as np_cumsum(data_decoded)
+def iter_cumsum_blocks(data_decoded: ndarray, block_rows: int = FORMAT_CHUNK_ROWS):
+    # Starting each block from the last sum keeps the order of the additions of np_cumsum
+    carry = np_cumsum(data_decoded[:0])
+    for start in range(0, len(data_decoded), block_rows):
+        block = np_cumsum(
+            np_concatenate((carry, data_decoded[start : start + block_rows]))
+        )
+        yield block[len(carry) :]
+        carry = block[-1:]
+
+
+# Yield [timestamps, miliseconds] of the samples in [start, end) in blocks of block_rows,
+# the same values as compute_sample_periods without holding the whole channel in memory
+def iter_sample_periods(
+    sample_rate: int,
+    measured_timestamp: str,
+    start: int,
+    end: int,
+    block_rows: int = FORMAT_CHUNK_ROWS,
+):
+    for block_start in range(start, end, block_rows):
+        yield compute_sample_periods_range(
+            sample_rate=sample_rate,
+            measured_timestamp=measured_timestamp,
+            start=block_start,
+            end=min(block_start + block_rows, end),
+        )
+
+
+# Blocks of compute_sample_periods_unit_ms, the milliseconds are summed block by block
+def iter_sample_periods_unit_ms(
+    data_decoded: ndarray,
+    measured_timestamp: str,
+    block_rows: int = FORMAT_CHUNK_ROWS,
+):
+    return iter_miliseconds_timestamps(
+        miliseconds_blocks=iter_cumsum_blocks(data_decoded, block_rows),
+        measured_timestamp=measured_timestamp,
+    )
+
+
+# Add the timestamps to blocks of already computed milliseconds
+def iter_miliseconds_timestamps(miliseconds_blocks, measured_timestamp: str):
+    timestamp_start = datatime_to_timestamp(measured_timestamp)
+    for miliseconds in miliseconds_blocks:
+        timestamps = np_array(timestamp_start + miliseconds, dtype="datetime64[ms]")
+        yield [timestamps, miliseconds]
+
+
+# Blocks of block_rows rows of an array, the last block may be shorter
+def iter_array_blocks(array: ndarray, block_rows: int = FORMAT_CHUNK_ROWS):
+    for start in range(0, len(array), block_rows):
+        yield array[start : start + block_rows]
+
+
+# Join the first num_rows rows of the blocks into whole columns, used by the binary export
+def collect_sample_periods(sample_periods, num_rows: int) -> list[ndarray, ndarray]:
+    blocks = list(sample_periods)
+    if len(blocks) == 0:
+        return [np_empty(0, dtype="datetime64[ms]"), np_empty(0, dtype=np_float64)]
+    timestamps = np_concatenate([timestamps for timestamps, _ in blocks])
+    miliseconds = np_concatenate([miliseconds for _, miliseconds in blocks])
+    return [timestamps[:num_rows], miliseconds[:num_rows]]
+
+
 # Decode sample data
 def sample_data_decode(data_enc, raw_data: bytes) -> list[tuple[float, ...]]:
     if data_enc == "list":
-        unpacked_data = list_decode_data(raw_data=raw_data)
+        # JSON/msgpack decoders need bytes, list channels are small so copying a mapped view is cheap
+        unpacked_data = list_decode_data(raw_data=bytes(raw_data))
     else:
         format_string = "".join(format_char for _, format_char in data_enc)
         dtype = format_string_to_numpy_dtype(fromat_string=format_string)
@@ -193,6 +520,21 @@ def format_string_to_numpy_dtype(fromat_string: str) -> np_dtype:
     return np_dtype(fromats)
 
 
+# Same layout as format_string_to_numpy_dtype, but fields are named after data_enc (e.g. x, y, z)
+def data_enc_to_numpy_dtype(data_enc) -> np_dtype:
+    format_string = "".join(format_char for _, format_char in data_enc)
+    dtype = format_string_to_numpy_dtype(fromat_string=format_string)
+    names = [name for name, _ in data_enc]
+    if dtype.names is None or "" in names or len(set(names)) != len(names):
+        return dtype
+    return np_dtype(
+        [
+            (name, dtype.fields[field_name][0])
+            for name, field_name in zip(names, dtype.names)
+        ]
+    )
+
+
 # Convert decoded data to string
 def data_fromat(data: float | tuple) -> str:
     if type(data) is not np_void:
@@ -211,11 +553,157 @@ def float_to_string(float_number: float) -> str:
     return "%f" % (float_number)
 
 
+# Order worker tasks from the largest channel (part) to the smallest
+def sort_tasks_by_size(tasks: list[Dict]) -> list[Dict]:
+    return sorted(tasks, key=lambda task: task["data_size"], reverse=True)
+
+
+# Path of the .txt/.csv file written by one part of a split channel
+def channel_part_path(
+    path_save_data: str, channel_label: str, part_index: int, extension: str
+) -> str:
+    return f"{path_save_data}/{channel_label}.part{part_index}.{extension}"
+
+
+# Paths of the .txt, .csv and .npy files written by one task, part files for a part of a split channel.
+# Compressed text files get the suffix of the codec, e.g. .txt.gz
+def get_task_output_paths(
+    path_save_data: str,
+    channel_label: str,
+    part_index: int | None,
+    compression: str | None = None,
+) -> tuple[str, str, Dict[str, str]]:
+    suffix = compression_suffix(compression)
+    if part_index is None:
+        OSC_file_path = f"{path_save_data}/{channel_label}.txt{suffix}"
+        CSV_file_path = f"{path_save_data}/{channel_label}.csv{suffix}"
+        NPY_file_paths = {
+            column: f"{path_save_data}/{channel_label}.{extension}"
+            for column, extension in NPY_COLUMNS.items()
+        }
+    else:
+        OSC_file_path = channel_part_path(
+            path_save_data, channel_label, part_index, f"txt{suffix}"
+        )
+        CSV_file_path = channel_part_path(
+            path_save_data, channel_label, part_index, f"csv{suffix}"
+        )
+        NPY_file_paths = {
+            column: channel_part_path(
+                path_save_data, channel_label, part_index, extension
+            )
+            for column, extension in NPY_COLUMNS.items()
+        }
+    return OSC_file_path, CSV_file_path, NPY_file_paths
+
+
+# Remove the files that exist among file_paths, used for the outputs of cancelled tasks
+def remove_files(file_paths: list[str]):
+    for file_path in file_paths:
+        try:
+            os_remove(file_path)
+        except FileNotFoundError:
+            pass
+
+
+# Header lines at the top of a .txt file
+def OSC_header(DURATION: str, DATAPOINTS: int) -> str:
+    return "#DURATION %s\n#DATAPOINTS %d\n\n" % (DURATION, DATAPOINTS)
+
+
+# Join the part files of a split channel into its .txt/.csv/.npy files, then remove the parts.
+# part_checksums are the checksums the workers sent for their part files (by file name),
+# the size and CRC-32 of each joined file (by path) are computed from them
+def stitch_channel_parts(
+    path_save_data: str,
+    channel_label: str,
+    num_parts: int,
+    part_checksums: Dict[str, Dict[str, any]],
+    DURATION: str,
+    DATAPOINTS: int,
+    formats: tuple[str, ...] = TEXT_FORMATS,
+    NPY_dtypes: Dict[str, tuple[np_dtype, int]] | None = None,
+    compression: str | None = None,
+) -> Dict[str, Dict[str, any]]:
+    suffix = compression_suffix(compression)
+    OSC_file_path = f"{path_save_data}/{channel_label}.txt{suffix}"
+    CSV_file_path = f"{path_save_data}/{channel_label}.csv{suffix}"
+    # Files to build from the parts, with the extension of their part files and the
+    # checksum of the header written in front of the parts
+    stitched_files = []
+    try:
+        # The .csv file has no header, create it empty before appending the parts
+        if "csv" in formats:
+            CSV_file, counting_file = open_output_file(CSV_file_path, binary=True)
+            CSV_file.close()
+            stitched_files.append(
+                (CSV_file_path, f"csv{suffix}", counting_file.checksum())
+            )
+        if "txt" in formats:
+            OSC_file, counting_file = open_output_file(
+                OSC_file_path, binary=compression is not None
+            )
+            with OSC_file:
+                # Compressed parts are complete streams, the header is one more stream in front of them
+                if compression is not None:
+                    OSC_file.write(
+                        compress_block(
+                            OSC_header(DURATION, DATAPOINTS).encode(), compression
+                        )
+                    )
+                else:
+                    # Write header
+                    OSC_file.write(OSC_header(DURATION, DATAPOINTS))
+            stitched_files.append(
+                (OSC_file_path, f"txt{suffix}", counting_file.checksum())
+            )
+        # Parts of .npy files are raw array data, the header is written with the shape of the whole channel
+        if "npy" in formats:
+            for column, extension in NPY_COLUMNS.items():
+                NPY_file_path = f"{path_save_data}/{channel_label}.{extension}"
+                dtype, count = NPY_dtypes[column]
+                NPY_file, counting_file = open_output_file(NPY_file_path, binary=True)
+                with NPY_file:
+                    write_array_header_1_0(
+                        NPY_file,
+                        {
+                            "descr": dtype_to_descr(dtype),
+                            "fortran_order": False,
+                            "shape": (count,),
+                        },
+                    )
+                stitched_files.append(
+                    (NPY_file_path, extension, counting_file.checksum())
+                )
+        checksums = {}
+        for file_path, extension, header_checksum in stitched_files:
+            part_paths = [
+                channel_part_path(path_save_data, channel_label, part_index, extension)
+                for part_index in range(num_parts)
+            ]
+            append_files(destination_path=file_path, source_paths=part_paths)
+            # The joined file is never read again
+            checksums[file_path] = combine_checksums(
+                [
+                    header_checksum,
+                    *(
+                        part_checksums[os_basename(part_path)]
+                        for part_path in part_paths
+                    ),
+                ]
+            )
+            for part_path in part_paths:
+                os_remove(part_path)
+    except:
+        raise FileWriteError
+    return checksums
+
+
 # Workers decompress KDF files
 def worker_KDF_extract(
     data_enc,
     unit: str,
-    raw_data: bytes,
+    raw_data: bytes | None,
     measured_timestamp: str,
     total_values: int,
     sample_rate: str,
@@ -225,11 +713,55 @@ def worker_KDF_extract(
     path_save_data: str,
     pipe: Connection,
     task_id: int,
+    KDF_file_path: str | None = None,
+    data_offset: int | None = None,
+    data_size: int | None = None,
+    record_range: tuple[int, int] | None = None,
+    part_index: int | None = None,
+    formats: tuple[str, ...] = TEXT_FORMATS,
+    time_window: tuple[float | None, float | None] | None = None,
+    compression: str | None = None,
 ):
+    OSC_file_path, CSV_file_path, NPY_file_paths = get_task_output_paths(
+        path_save_data=path_save_data,
+        channel_label=channel_label,
+        part_index=part_index,
+        compression=compression,
+    )
     try:
-        unpacked_data = sample_data_decode(data_enc=data_enc, raw_data=raw_data)
+        # Waits here while the extraction is paused, tasks of a cancelled extraction never start
+        check_worker_control()
+        # Without raw_data the worker maps its own slice of the KDF file
+        if raw_data is None:
+            raw_data = map_channel_data(
+                KDF_file_path=KDF_file_path,
+                data_offset=data_offset,
+                data_size=data_size,
+            )
+        if data_enc == "list":
+            # Events are decoded and formatted while the rows are written.
+            # zip only takes a number from events_read for an event it yields, the next
+            # number of events_read is the number of events read from events
+            num_events, events = iter_list_events(
+                raw_data=raw_data, total_values=total_values
+            )
+            events_read = iter_count()
+            unpacked_data = (
+                format_list_event(event) for event, _ in zip(events, events_read)
+            )
+        else:
+            unpacked_data = sample_data_decode(data_enc=data_enc, raw_data=raw_data)
+            num_events = len(unpacked_data)
         miliseconds = None
         timestamps = None
+        progress = ProgressReporter(
+            pipe=pipe,
+            task_id=task_id,
+            part_index=part_index,
+            channel_label=channel_label,
+            file_name=file_name,
+        )
+        progress.update(samples_decoded=num_events)
 
         # Set sennor type name
         channel_type = (
@@ -238,184 +770,495 @@ def worker_KDF_extract(
             else "VS" if channel_label == "PPG" else channel_label
         )
 
-        # The unpacked_data is a JSON and needs to be converted to a list of strings
-        if data_enc == "list":
-            if isinstance(unpacked_data, list):
-                unpacked_data = [
-                    ", ".join([f"{key}: {value}" for key, value in value.items()])
-                    for value in unpacked_data
-                ]
-            else:
-                unpacked_data = [
-                    ", ".join(
-                        [f"{key}: {value}" for key, value in unpacked_data.items()]
-                    )
-                ]
-
-        DURATION = None
-        DATAPOINTS = len(unpacked_data)
+        # A channel (window) without rows lasts 0 ms
+        DURATION = float_to_string(0)
+        DATAPOINTS = num_events
 
-        # Sensors given 'ms' will calculate milliseconds by summing the values ​​from the decoded data
-        if unit == "ms":
-            timestamps, miliseconds = compute_sample_periods_unit_ms(
+        # Timestamps are generated block by block while the rows are written,
+        # sample_periods creates a new generator over them for each consumer
+        sample_periods = None
+        num_rows = DATAPOINTS
+        # Sensors given 'ms' will calculate milliseconds by summing the values from the decoded data
+        if record_range is None and unit == "ms" and time_window is not None:
+            # The rows of a time window are found by searching the summed milliseconds
+            miliseconds = np_cumsum(unpacked_data)
+            first, last = find_miliseconds_window(miliseconds, *time_window)
+            unpacked_data = unpacked_data[first:last]
+            miliseconds = miliseconds[first:last]
+            DATAPOINTS = num_rows = len(unpacked_data)
+            sample_periods = lambda: iter_miliseconds_timestamps(
+                miliseconds_blocks=iter_array_blocks(miliseconds),
+                measured_timestamp=measured_timestamp,
+            )
+            if len(miliseconds) != 0:
+                DURATION = format_float_column(miliseconds[-1:])[0]
+        elif record_range is None and unit == "ms":
+            sample_periods = partial(
+                iter_sample_periods_unit_ms,
                 data_decoded=unpacked_data,
                 measured_timestamp=measured_timestamp,
             )
+            for miliseconds in iter_cumsum_blocks(unpacked_data):
+                DURATION = format_float_column(miliseconds[-1:])[0]
         # Sensors with an encoding data type of "list" will not have a timestamp
-        elif data_enc != "list":
-            timestamps, miliseconds = compute_sample_periods(
+        elif record_range is not None or data_enc != "list":
+            num_periods = count_sample_periods(
+                sample_rate=sample_rate, total_values=total_values
+            )
+            # A part of a split channel only computes the timestamps of its own records
+            start, end = record_range if record_range is not None else (0, num_periods)
+            end = min(end, num_periods)
+            sample_periods = partial(
+                iter_sample_periods,
                 sample_rate=sample_rate,
                 measured_timestamp=measured_timestamp,
-                total_values=total_values,
+                start=start,
+                end=end,
             )
+            # Rows stop at the shortest column, the same as zip()
+            num_rows = max(0, min(end - start, DATAPOINTS))
+            if end > start:
+                _, miliseconds = compute_sample_periods_range(
+                    sample_rate=sample_rate,
+                    measured_timestamp=measured_timestamp,
+                    start=end - 1,
+                    end=end,
+                )
+                DURATION = format_float_column(miliseconds)[0]
 
-        # Format data from float to string, used for writing data to file
-        if data_enc != "list":
-            miliseconds = [float_to_string(ms) for ms in miliseconds]
-            unpacked_data = [data_fromat(data) for data in unpacked_data]
-            DURATION = miliseconds[-1]
+        # Keep the decoded arrays for the binary export
+        NPY_columns = None
+        if "npy" in formats:
+            if data_enc == "list":
+                # The .npy file is one array of every event, so the event strings are kept
+                unpacked_data = list(unpacked_data)
+                DATAPOINTS = num_rows = len(unpacked_data)
+            NPY_columns = {"data": unpacked_data}
+            if data_enc != "list":
+                # Name the fields after data_enc, the memory layout does not change
+                NPY_columns["data"] = unpacked_data.view(
+                    data_enc_to_numpy_dtype(data_enc)
+                )
+                # Timestamps are written for the same rows as the text files
+                NPY_columns["timestamps"], NPY_columns["miliseconds"] = (
+                    collect_sample_periods(sample_periods(), num_rows)
+                )
 
         if data_enc == "list":
-            # List data will not have timestamps and miliseconds values ​​so it needs to be initialized to 'N/A'
-            # It is initialized to 2 times the number of elements contained in "unpacked_data" because this is a Generator,
-            # it needs (len(unpacked_data) * 2) because it is used in two different functions to write to .txt and .csv files
-            timestamps = ("N/A" for _ in range(len(unpacked_data) * 2))
-            miliseconds = ("N/A" for _ in range(len(unpacked_data) * 2))
+            # List data has no timestamps and miliseconds, the text writer fills them with 'N/A'
+            sample_periods = None
             DURATION = "N/A"
 
-        OSC_file_path = f"{path_save_data}/{channel_label}.txt"
-        CSV_file_path = f"{path_save_data}/{channel_label}.csv"
-        asyncio_run(
-            write_file(
-                OSC_file_path=OSC_file_path,
-                CSV_file_path=CSV_file_path,
-                channel_label=channel_label,
-                channel_type=channel_type,
-                unpacked_data=unpacked_data,
-                miliseconds=miliseconds,
-                timestamps=timestamps,
-                file_name=file_name,
-                DATAPOINTS=DATAPOINTS,
-                DURATION=DURATION,
-                pipe=pipe,
-                task_id=task_id,
-            )
+        progress.update(total_rows=num_rows)
+        write_channel = partial(
+            write_file,
+            OSC_file_path=OSC_file_path,
+            CSV_file_path=CSV_file_path,
+            channel_label=channel_label,
+            channel_type=channel_type,
+            sample_periods=sample_periods,
+            file_name=file_name,
+            DURATION=DURATION,
+            pipe=pipe,
+            task_id=task_id,
+            # Part files only contain rows, the header is written when the parts are stitched
+            write_header=part_index is None,
+            formats=formats,
+            NPY_file_paths=NPY_file_paths,
+            NPY_columns=NPY_columns,
+            progress=progress,
+            compression=compression,
+        )
+        file_checksums = write_channel(
+            unpacked_data=unpacked_data, num_rows=num_rows, DATAPOINTS=DATAPOINTS
         )
+        # The number of events of a JSON array comes from the channel header. When the array
+        # holds another number of events, the channel is written again with that number
+        if data_enc == "list" and file_checksums is not None:
+            num_events = next(events_read) + sum(1 for _ in events)
+            if num_events != num_rows:
+                _, events = iter_list_events(raw_data=raw_data, total_values=num_events)
+                progress.update(total_rows=num_events)
+                file_checksums = write_channel(
+                    unpacked_data=map(format_list_event, events),
+                    num_rows=num_events,
+                    DATAPOINTS=num_events,
+                )
+    except ExtractionCancelledError:
+        file_checksums = None
     except Exception as e:
         print(f"loi {e}")
+        file_checksums = None
+        # Report the error, the task still ends below, otherwise the extractor would wait for it forever
+        pipe.send({"task_id": task_id, "message": f"{channel_label} - {e}"})
 
+    # The files of a cancelled task are incomplete, they are removed before the task ends
+    if is_worker_cancelled():
+        remove_files(
+            [OSC_file_path, CSV_file_path, *NPY_file_paths.values()],
+        )
+        pipe.send({"task_id": task_id, "message": "cancelled"})
+    # The files of a failed task are not recorded as complete
+    elif file_checksums is None:
+        pipe.send({"task_id": task_id, "message": "failed"})
+    # Send a message notifying the task has been completed, with the size and CRC-32 of
+    # each file it wrote (by file name) for the manifest
+    pipe.send(
+        {
+            "task_id": task_id,
+            "message": "end",
+            "part_index": part_index,
+            "files": {
+                os_basename(file_path): checksum
+                for file_path, checksum in (file_checksums or {}).items()
+            },
+        }
+    )
 
-async def write_file(
+
+def write_file(
     OSC_file_path: str,
     CSV_file_path: str,
     channel_label: str,
     channel_type: str,
-    unpacked_data: list,
-    timestamps: list,
-    miliseconds: list,
+    unpacked_data: ndarray | Iterable[str],
+    sample_periods: Callable[[], Iterator] | None,
+    num_rows: int,
     file_name: str,
     DATAPOINTS: int,
     DURATION: str,
     pipe: Connection,
     task_id: int,
-):
+    write_header: bool = True,
+    formats: tuple[str, ...] = TEXT_FORMATS,
+    NPY_file_paths: Dict[str, str] | None = None,
+    NPY_columns: Dict[str, ndarray] | None = None,
+    progress: ProgressReporter | None = None,
+    compression: str | None = None,
+) -> Dict[str, Dict[str, any]] | None:
 
     channel_data = f"{file_name}/{channel_type}/{channel_label}"
 
-    tasks = []
-    OSC_kwargs = {
-        "OSC_file_path": OSC_file_path,
-        "channel_data": channel_data,
-        "sennor_data": zip(timestamps, miliseconds, unpacked_data),
-        "DURATION": DURATION,
-        "DATAPOINTS": DATAPOINTS,
-    }
-    CSV_kwargs = {
-        "CSV_file_path": CSV_file_path,
-        "channel_type": channel_type,
-        "channel_label": channel_label,
-        "file_name": file_name,
-        "sennor_data": zip(timestamps, miliseconds, unpacked_data),
-    }
-    # Add write_CSV_file to tasks
-    task = asyncio_create_task(write_CSV_file(**CSV_kwargs))
-    task.set_name(CSV_file_path)
-    task.add_done_callback(
-        lambda t: pipe.send(
-            {
-                "task_id": task_id,
-                "message": f"{t.get_name()} - {t.exception().__str__() if t.exception() else "saved"}",
-            }
-        )
-    )
-    tasks.append(task)
-    # Add write_OSC_file to tasks
-    task = asyncio_create_task(write_OSC_file(**OSC_kwargs))
-    task.set_name(OSC_file_path)
-    task.add_done_callback(
-        lambda t: pipe.send(
-            {
-                "task_id": task_id,
-                "message": f"{t.get_name()} - {t.exception().__str__() if t.exception() else "saved"}",
-            }
+    # Outcome of each writer, (paths of the files it writes, checksums by path or the error)
+    outcomes = []
+    # The .npy files are written by a thread of their own while the rows are formatted,
+    # the text writer runs in this thread and is the only one sending to the pipe
+    with ThreadPoolExecutor(max_workers=1) as NPY_executor:
+        NPY_future = None
+        if "npy" in formats:
+            NPY_future = NPY_executor.submit(
+                write_NPY_file,
+                NPY_file_paths=NPY_file_paths,
+                NPY_columns=NPY_columns,
+                write_header=write_header,
+            )
+        # txt and csv share one writer, every row is formatted once for both files
+        text_file_paths = {
+            file_format: file_path
+            for file_format, file_path in (
+                ("csv", CSV_file_path),
+                ("txt", OSC_file_path),
+            )
+            if file_format in formats
+        }
+        if len(text_file_paths) != 0:
+            try:
+                result = write_text_files(
+                    OSC_file_path=text_file_paths.get("txt"),
+                    CSV_file_path=text_file_paths.get("csv"),
+                    channel_data=channel_data,
+                    channel_type=channel_type,
+                    channel_label=channel_label,
+                    file_name=file_name,
+                    sample_periods=None if sample_periods is None else sample_periods(),
+                    num_rows=num_rows,
+                    unpacked_data=unpacked_data,
+                    DURATION=DURATION,
+                    DATAPOINTS=DATAPOINTS,
+                    write_header=write_header,
+                    progress=progress,
+                    compression=compression,
+                )
+            except Exception as e:
+                result = e
+            outcomes.append((list(text_file_paths.values()), result))
+        if NPY_future is not None:
+            outcomes.append(
+                (
+                    [NPY_file_paths["data"]],
+                    NPY_future.exception() or NPY_future.result(),
+                )
+            )
+
+    # One message per written file. A part file is only reported when it failed, the channel
+    # file is reported saved once it is stitched. Files of a cancelled task are removed,
+    # the worker reports the cancellation once
+    for file_paths, result in outcomes:
+        error = result if isinstance(result, Exception) else None
+        if isinstance(error, ExtractionCancelledError) or is_worker_cancelled():
+            continue
+        for file_path in file_paths:
+            if write_header or error is not None:
+                pipe.send(
+                    {
+                        "task_id": task_id,
+                        "message": f"{file_path} - {error.__str__() if error else "saved"}",
+                    }
+                )
+
+    file_checksums = [
+        result for _, result in outcomes if not isinstance(result, Exception)
+    ]
+    # Final progress of the task, sent even if the last update was less than an interval ago
+    if progress is not None:
+        progress.update(
+            force=True,
+            rows_written=num_rows,
+            bytes_written=sum(
+                checksum["size"]
+                for checksums in file_checksums
+                for checksum in checksums.values()
+            ),
         )
-    )
-    tasks.append(task)
-    # Run tasks and waiting for it done
-    await asyncio_wait(tasks)
 
-    # Send a message notifying the task has been completed
-    pipe.send({"task_id": task_id, "message": "end"})
+    # Size and CRC-32 of every file by path, None when a file could not be written
+    if len(file_checksums) != len(outcomes):
+        return None
+    return {
+        file_path: checksum
+        for checksums in file_checksums
+        for file_path, checksum in checksums.items()
+    }
+
 
+# Convert one chunk of rows to the strings of the text columns.
+# Numeric columns are formatted here chunk by chunk, list channels (timestamps is None) get 'N/A'
+def format_text_chunk(
+    timestamps: ndarray | None,
+    miliseconds: ndarray | None,
+    unpacked_data: ndarray | list[str],
+) -> tuple[list[str], list[str], list[str]]:
+    if timestamps is None:
+        timestamp_strings = ["N/A"] * len(unpacked_data)
+        return timestamp_strings, timestamp_strings, unpacked_data
+    # Same text as str() of each datetime64, done in one call
+    timestamp_strings = np_datetime_as_string(timestamps).tolist()
+    miliseconds_strings = format_float_column(miliseconds)
+    # Numeric columns are rendered in bulk, anything else falls back to the per-sample formatter
+    if is_numeric_dtype(unpacked_data.dtype):
+        data_strings = format_data_column(unpacked_data)
+    else:
+        data_strings = [data_fromat(data) for data in unpacked_data]
+    return timestamp_strings, miliseconds_strings, data_strings
 
-async def write_OSC_file(
-    OSC_file_path: str,
+
+# Write (file, text) chunks from the queue until None is received, runs in its own thread.
+# With a compression every chunk is compressed here into its own stream, while the next chunk is formatted.
+# After an error the queue is still drained so the formatting side never blocks on a full queue
+def write_queued_chunks(
+    chunk_queue: Queue, errors: list[Exception], compression: str | None = None
+):
+    while (chunk := chunk_queue.get()) is not None:
+        if len(errors) != 0:
+            continue
+        file, text = chunk
+        try:
+            if compression is not None:
+                file.write(compress_block(text.encode(), compression))
+            else:
+                file.write(text)
+        except Exception as e:
+            errors.append(e)
+
+
+# Write the first num_rows rows of a channel to the .txt and/or .csv file in one pass.
+# sample_periods yields the [timestamps, miliseconds] blocks, None for list channels.
+# Every chunk of rows is formatted once and shared by both files, a writer thread
+# flushes the chunks while the next one is formatted. At most WRITE_QUEUE_DEPTH chunks
+# wait in memory, independent of the size of the channel.
+# With a compression the files are a series of compressed streams, one per chunk (UTF-8 text)
+def write_text_files(
+    OSC_file_path: str | None,
+    CSV_file_path: str | None,
     channel_data: str,
-    sennor_data: zip,
+    channel_type: str,
+    channel_label: str,
+    file_name: str,
+    sample_periods: Iterator | None,
+    num_rows: int,
+    unpacked_data: ndarray | Iterable[str],
     DURATION: str,
     DATAPOINTS: int,
+    write_header: bool = True,
+    progress: ProgressReporter | None = None,
+    compression: str | None = None,
 ):
+    # The rows of list channels are taken from the iterator chunk by chunk
+    if sample_periods is None:
+        unpacked_data = iter(unpacked_data)
     try:
-        with open(file=OSC_file_path, mode="w") as OSC_file:
-            # Write header
-            OSC_file.write("#DURATION %s\n" % DURATION)
-            OSC_file.write("#DATAPOINTS %d\n" % DATAPOINTS)
-            OSC_file.write("\n")
-            # Write header
-            for timestamps, miliseconds, unpacked_data in sennor_data:
-                OSC_file.write(
-                    "%s %s %s %s\n"
-                    % (
-                        timestamps,
-                        miliseconds,
-                        channel_data,
-                        unpacked_data,
+        with ExitStack() as stack:
+            OSC_file = None
+            CSV_file = None
+            # Bytes written to each file, after encoding and compression
+            counting_files = {}
+            if OSC_file_path is not None:
+                OSC_file, counting_files[OSC_file_path] = open_output_file(
+                    OSC_file_path, binary=compression is not None
+                )
+                stack.enter_context(OSC_file)
+                # Write header, a compressed file gets it as a stream of its own
+                if write_header and compression is not None:
+                    OSC_file.write(
+                        compress_block(
+                            OSC_header(DURATION, DATAPOINTS).encode(), compression
+                        )
                     )
+                elif write_header:
+                    OSC_file.write(OSC_header(DURATION, DATAPOINTS))
+            if CSV_file_path is not None:
+                CSV_file, counting_files[CSV_file_path] = open_output_file(
+                    CSV_file_path, binary=compression is not None, newline=""
+                )
+                stack.enter_context(CSV_file)
+                # The fields that are the same on every row are quoted once by the csv module
+                CSV_constant = StringIO()
+                csv_writer(CSV_constant, lineterminator="").writerow(
+                    [file_name, channel_type, channel_label]
                 )
+                CSV_constant = CSV_constant.getvalue()
+
+            # Formatted numbers never need quoting, list values ("label: x, len: 0") and
+            # non-numeric data may, only their chunks are searched for special characters
+            may_need_quoting = sample_periods is None or not is_numeric_dtype(
+                unpacked_data.dtype
+            )
+
+            chunk_queue = Queue(maxsize=WRITE_QUEUE_DEPTH)
+            errors = []
+            writer_thread = Thread(
+                target=write_queued_chunks,
+                args=(chunk_queue, errors, compression),
+                daemon=True,
+            )
+            writer_thread.start()
+            try:
+                for start in range(0, num_rows, FORMAT_CHUNK_ROWS):
+                    # Stop formatting as soon as the disk side failed
+                    if len(errors) != 0:
+                        break
+                    # Pause and cancel take effect between chunks
+                    check_worker_control()
+                    end = min(start + FORMAT_CHUNK_ROWS, num_rows)
+                    # The blocks of sample_periods have FORMAT_CHUNK_ROWS rows as well
+                    timestamps, miliseconds = None, None
+                    if sample_periods is not None:
+                        timestamps, miliseconds = next(sample_periods)
+                        timestamps = timestamps[: end - start]
+                        miliseconds = miliseconds[: end - start]
+                        data_chunk = unpacked_data[start:end]
+                    else:
+                        data_chunk = list(islice(unpacked_data, end - start))
+                        # The array of a list channel may hold fewer events than its header
+                        if len(data_chunk) == 0:
+                            break
+                    timestamp_strings, miliseconds_strings, data_strings = (
+                        format_text_chunk(
+                            timestamps=timestamps,
+                            miliseconds=miliseconds,
+                            unpacked_data=data_chunk,
+                        )
+                    )
+
+                    chunks = []
+                    if OSC_file is not None:
+                        OSC_rows = zip(
+                            timestamp_strings,
+                            miliseconds_strings,
+                            repeat(channel_data),
+                            data_strings,
+                        )
+                        chunks.append(
+                            (OSC_file, "\n".join(map(" ".join, OSC_rows)) + "\n")
+                        )
+
+                    if (
+                        CSV_file is not None
+                        and may_need_quoting
+                        and any(
+                            CSV_SPECIAL_CHARACTERS.search(data) for data in data_strings
+                        )
+                    ):
+                        CSV_chunk = StringIO()
+                        csv_writer(CSV_chunk).writerows(
+                            zip(
+                                timestamp_strings,
+                                miliseconds_strings,
+                                repeat(file_name),
+                                repeat(channel_type),
+                                repeat(channel_label),
+                                data_strings,
+                            )
+                        )
+                        chunks.append((CSV_file, CSV_chunk.getvalue()))
+                    elif CSV_file is not None:
+                        CSV_rows = zip(
+                            timestamp_strings,
+                            miliseconds_strings,
+                            repeat(CSV_constant),
+                            data_strings,
+                        )
+                        chunks.append(
+                            (CSV_file, "\r\n".join(map(",".join, CSV_rows)) + "\r\n")
+                        )
+
+                    for chunk in chunks:
+                        chunk_queue.put(chunk)
+                    if progress is not None:
+                        # Chunks still in the queue are not counted until they are written
+                        progress.update(
+                            rows_written=end,
+                            bytes_written=sum(
+                                counting_file.size
+                                for counting_file in counting_files.values()
+                            ),
+                        )
+            finally:
+                # The files are closed by the ExitStack only after the writer thread is done
+                chunk_queue.put(None)
+                writer_thread.join()
+            if len(errors) != 0:
+                raise errors[0]
+        return {
+            file_path: counting_file.checksum()
+            for file_path, counting_file in counting_files.items()
+        }
+    except ExtractionCancelledError:
+        raise
     except:
         raise FileWriteError
 
 
-async def write_CSV_file(
-    CSV_file_path: str,
-    channel_type: str,
-    channel_label: str,
-    file_name: str,
-    sennor_data: zip,
+def write_NPY_file(
+    NPY_file_paths: Dict[str, str],
+    NPY_columns: Dict[str, ndarray],
+    write_header: bool = True,
 ):
     try:
-        with open(file=CSV_file_path, mode="w", newline="") as CSV_file:
-            csvwriter = csv_writer(CSV_file)
-            for timestamps, miliseconds, unpacked_data in sennor_data:
-                csvwriter.writerow(
-                    [
-                        timestamps,
-                        miliseconds,
-                        file_name,
-                        channel_type,
-                        channel_label,
-                        unpacked_data,
-                    ]
-                )
+        file_checksums = {}
+        for column, array in NPY_columns.items():
+            NPY_file, counting_file = open_output_file(
+                NPY_file_paths[column], binary=True
+            )
+            with NPY_file:
+                # Whole channels are standard .npy files, parts only contain the raw array data
+                if write_header:
+                    np_save(NPY_file, array, allow_pickle=False)
+                else:
+                    NPY_file.write(
+                        np_ascontiguousarray(array).reshape(-1).view(np_uint8)
+                    )
+            file_checksums[NPY_file_paths[column]] = counting_file.checksum()
+        return file_checksums
     except:
         raise FileWriteError
@@ -0,0 +1,81 @@
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from multiprocessing import Event
+from multiprocessing.synchronize import Event as EventType
+from typing import Optional
+
+from ..exceptions import ExtractionCancelledError
+
+# Seconds the extractor waits for a worker event before it checks for a cancellation again
+CONTROL_POLL_INTERVAL = 0.1
+
+
+# Event that starts in the set state
+def create_set_event() -> EventType:
+    event = Event()
+    event.set()
+    return event
+
+
+# Cancel and pause state of one extraction, shared by the main process and its workers.
+# The workers receive it through the initializer of the process pool (see init_worker_control),
+# multiprocessing events can only be shared when the processes are created
+@dataclass
+class ExtractionControl:
+    cancel_event: EventType = field(default_factory=Event)
+    # Set while the workers may run, cleared while the extraction is paused
+    run_event: EventType = field(default_factory=create_set_event)
+
+    def cancel(self):
+        self.cancel_event.set()
+        # Paused workers have to wake up to see the cancellation
+        self.run_event.set()
+
+    def pause(self):
+        self.run_event.clear()
+
+    def resume(self):
+        self.run_event.set()
+
+    # Ready for the next extraction on the same workers
+    def reset(self):
+        self.cancel_event.clear()
+        self.run_event.set()
+
+    def is_cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def is_paused(self) -> bool:
+        return not self.run_event.is_set()
+
+    # Wait while the extraction is paused, raise ExtractionCancelledError once it was cancelled
+    def check(self):
+        self.run_event.wait()
+        if self.is_cancelled():
+            raise ExtractionCancelledError
+
+
+# Control of the extraction the current worker process belongs to
+worker_control: Optional[ExtractionControl] = None
+
+
+# Initializer of the process pool, keeps the control for check_worker_control
+def init_worker_control(control: ExtractionControl):
+    global worker_control
+    worker_control = control
+
+
+# Called by the workers before a task and between chunks of rows
+def check_worker_control():
+    if worker_control is not None:
+        worker_control.check()
+
+
+def is_worker_cancelled() -> bool:
+    return worker_control is not None and worker_control.is_cancelled()
+
+
+# Cancel the submitted tasks that did not start yet, they never send "end".
+# futures are (task_id, future) pairs, the task ids of the cancelled futures are returned
+def cancel_pending_futures(futures: list[tuple[any, Future]]) -> list[any]:
+    return [task_id for task_id, future in futures if future.cancel()]
@@ -0,0 +1,216 @@
+from bz2 import compress as bz2_compress
+from gzip import compress as gzip_compress
+from io import BufferedWriter, RawIOBase, TextIOWrapper
+from lzma import compress as lzma_compress
+from os import fstat as os_fstat
+from typing import IO, BinaryIO, Dict
+from zlib import crc32 as zlib_crc32
+
+from ..exceptions import UnsupportedCompressionError
+
+# In-kernel copies are only available on some platforms (Linux)
+try:
+    from os import copy_file_range as os_copy_file_range
+except ImportError:
+    os_copy_file_range = None
+try:
+    from os import sendfile as os_sendfile
+except ImportError:
+    os_sendfile = None
+
+# Maximum number of bytes copied per system call / read
+COPY_BLOCK_SIZE = 16 * 1024 * 1024
+
+# Codecs of the compressed text files and the suffix added to their names
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "bz2": ".bz2", "lzma": ".xz"}
+# zlib's default level, level 9 of gzip.compress is several times slower for a few percent
+GZIP_COMPRESS_LEVEL = 6
+
+
+# Copy with copy_file_range (Linux >= 4.5), data never leaves the kernel
+def copy_with_copy_file_range(
+    source_fd: int, destination_fd: int, offset: int, count: int
+) -> int:
+    return os_copy_file_range(source_fd, destination_fd, count, offset)
+
+
+# Copy with sendfile (Linux allows a regular file as destination)
+def copy_with_sendfile(
+    source_fd: int, destination_fd: int, offset: int, count: int
+) -> int:
+    return os_sendfile(destination_fd, source_fd, offset, count)
+
+
+# Copy the whole source file to the current position of the destination file.
+# Both files must be unbuffered (buffering=0) so their positions are the kernel positions
+def copy_file_data(source_file: BinaryIO, destination_file: BinaryIO):
+    source_fd = source_file.fileno()
+    destination_fd = destination_file.fileno()
+    file_size = os_fstat(source_fd).st_size
+    copied = 0
+    for copy_function, available in (
+        (copy_with_copy_file_range, os_copy_file_range is not None),
+        (copy_with_sendfile, os_sendfile is not None),
+    ):
+        if not available:
+            continue
+        try:
+            while copied < file_size:
+                count = copy_function(
+                    source_fd,
+                    destination_fd,
+                    copied,
+                    min(file_size - copied, COPY_BLOCK_SIZE),
+                )
+                if count == 0:
+                    break
+                copied += count
+            return
+        except OSError:
+            # Not supported by this platform or file system, continue with the next method
+            continue
+    # Portable fallback, copy in large blocks through user space
+    source_file.seek(copied)
+    while block := source_file.read(COPY_BLOCK_SIZE):
+        # Unbuffered writes may be partial, write until the whole block is out
+        block = memoryview(block)
+        while len(block) != 0:
+            block = block[destination_file.write(block) :]
+
+
+# Raw output file that counts the bytes written to it and their CRC-32. It sits below the
+# buffer, the text encoding and the compression, so both are of what actually reached the file
+class CountingFile(RawIOBase):
+    def __init__(self, file_path: str):
+        self.file = open(file_path, "wb", buffering=0)
+        self.size = 0
+        self.crc32 = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        # Unbuffered writes may be partial, write until the whole block is out
+        block = memoryview(data).cast("B")
+        num_bytes = len(block)
+        while len(block) != 0:
+            block = block[self.file.write(block) :]
+        self.size += num_bytes
+        self.crc32 = zlib_crc32(data, self.crc32)
+        return num_bytes
+
+    # Size and CRC-32 of the written bytes, as recorded by the manifest
+    def checksum(self) -> Dict[str, any]:
+        return {"size": self.size, "crc32": "%08x" % self.crc32}
+
+    def close(self):
+        if not self.closed:
+            self.file.close()
+        super().close()
+
+
+# Open an output file for writing, the same as open(file_path, "wb") or
+# open(file_path, "w", newline=newline), and the CountingFile below it
+def open_output_file(
+    file_path: str, binary: bool = False, newline: str | None = None
+) -> tuple[IO, CountingFile]:
+    counting_file = CountingFile(file_path)
+    file = BufferedWriter(counting_file)
+    if not binary:
+        file = TextIOWrapper(file, newline=newline)
+    return file, counting_file
+
+
+# Append the content of source files to the end of the destination file, without loading them into memory
+def append_files(destination_path: str, source_paths: list[str]):
+    with open(destination_path, "r+b", buffering=0) as destination_file:
+        destination_file.seek(0, 2)
+        for source_path in source_paths:
+            with open(source_path, "rb", buffering=0) as source_file:
+                copy_file_data(
+                    source_file=source_file, destination_file=destination_file
+                )
+
+
+# CRC-32 of the whole file as 8 hex digits, the file is read in COPY_BLOCK_SIZE blocks
+def file_crc32(file_path: str) -> str:
+    checksum = 0
+    with open(file_path, "rb") as file:
+        while block := file.read(COPY_BLOCK_SIZE):
+            checksum = zlib_crc32(block, checksum)
+    return "%08x" % checksum
+
+
+# Product of a 32x32 matrix over GF(2) (one int per column) and a vector, used by crc32_combine
+def gf2_matrix_times(matrix: list[int], vector: int) -> int:
+    total = 0
+    index = 0
+    while vector:
+        if vector & 1:
+            total ^= matrix[index]
+        vector >>= 1
+        index += 1
+    return total
+
+
+# Product of the matrix with itself
+def gf2_matrix_square(matrix: list[int]) -> list[int]:
+    return [gf2_matrix_times(matrix, row) for row in matrix]
+
+
+# CRC-32 of the concatenation of two blocks from the CRC-32 of each block and the length of
+# the second one (crc32_combine of zlib), files joined by appending are never read again
+def crc32_combine(crc1: int, crc2: int, length2: int) -> int:
+    if length2 <= 0:
+        return crc1
+    # Operator for one zero bit, then squared for two and four zero bits
+    odd = [0xEDB88320] + [1 << row for row in range(31)]
+    even = gf2_matrix_square(odd)
+    odd = gf2_matrix_square(even)
+    while True:
+        even = gf2_matrix_square(odd)
+        if length2 & 1:
+            crc1 = gf2_matrix_times(even, crc1)
+        length2 >>= 1
+        if length2 == 0:
+            break
+        odd = gf2_matrix_square(even)
+        if length2 & 1:
+            crc1 = gf2_matrix_times(odd, crc1)
+        length2 >>= 1
+        if length2 == 0:
+            break
+    return crc1 ^ crc2
+
+
+# Size and CRC-32 of the files appended one after another, from the checksum of each file
+def combine_checksums(checksums: list[Dict[str, any]]) -> Dict[str, any]:
+    size = 0
+    crc32 = 0
+    for checksum in checksums:
+        crc32 = crc32_combine(crc32, int(checksum["crc32"], 16), checksum["size"])
+        size += checksum["size"]
+    return {"size": size, "crc32": "%08x" % crc32}
+
+
+# Compress one block into a complete gzip member / bz2 stream / xz stream. Such streams
+# written one after another form a valid multi-member file, so blocks are compressed on
+# their own (in any worker) and files are joined by appending their bytes
+def compress_block(data: bytes, compression: str) -> bytes:
+    if compression == "gzip":
+        # mtime=0, the same data always gives the same bytes
+        return gzip_compress(data, compresslevel=GZIP_COMPRESS_LEVEL, mtime=0)
+    if compression == "bz2":
+        return bz2_compress(data)
+    if compression == "lzma":
+        return lzma_compress(data)
+    raise UnsupportedCompressionError
+
+
+# Suffix of the compressed file names, "" without compression
+def compression_suffix(compression: str | None) -> str:
+    if compression is None:
+        return ""
+    if compression not in COMPRESSION_SUFFIXES:
+        raise UnsupportedCompressionError
+    return COMPRESSION_SUFFIXES[compression]
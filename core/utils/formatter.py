@@ -0,0 +1,87 @@
+from numpy import dtype as np_dtype
+from numpy import empty as np_empty
+from numpy import float64 as np_float64
+from numpy import ndarray
+from numpy import result_type as np_result_type
+
+# Number of rows rendered per "%" call, keeps the temporary tuple of values small
+FORMAT_CHUNK_ROWS = 65536
+
+# Integers up to 2**53 convert to float64 exactly, so "%d.000000" renders the same text as "%f"
+MAX_EXACT_INTEGER = 2**53
+
+
+# Check if a numpy dtype can be rendered by the batched formatter (numbers only, no bytes/objects)
+def is_numeric_dtype(dtype: np_dtype) -> bool:
+    if dtype.names is not None:
+        return all(is_numeric_dtype(dtype.fields[name][0]) for name in dtype.names)
+    return dtype.kind in "biuf"
+
+
+# Check if the matrix only contains integers that can be rendered with "%d.000000"
+def is_exact_integer_matrix(matrix: ndarray) -> bool:
+    if matrix.dtype.kind not in "biu":
+        return False
+    if matrix.size == 0 or matrix.dtype.itemsize < 8:
+        return True
+    return max(-int(matrix.min()), int(matrix.max())) <= MAX_EXACT_INTEGER
+
+
+# Convert a scalar or structured column into a 2-D matrix (one column per field)
+# Integer fields stay integers, everything else is converted to float64
+def column_as_matrix(data: ndarray) -> ndarray:
+    if data.dtype.names is None:
+        return data.reshape(len(data), -1)
+    field_dtypes = [data.dtype.fields[name][0] for name in data.dtype.names]
+    if all(field_dtype.kind in "biu" for field_dtype in field_dtypes):
+        matrix_dtype = np_result_type(*field_dtypes)
+        matrix_dtype = matrix_dtype if matrix_dtype.kind in "biu" else np_float64
+    else:
+        matrix_dtype = np_float64
+    matrix = np_empty((len(data), len(data.dtype.names)), dtype=matrix_dtype)
+    for index, name in enumerate(data.dtype.names):
+        matrix[:, index] = data[name]
+    return matrix
+
+
+# Render a matrix to a text block, each row is "%f %f ...", rows are ended by terminator
+# The output is identical to formatting every value with "%f"
+def render_float_block(matrix: ndarray, terminator: str = "\n") -> str:
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(-1, 1)
+    num_rows, num_columns = matrix.shape
+    if num_rows == 0:
+        return ""
+    if is_exact_integer_matrix(matrix):
+        value_format = "%d.000000"
+    else:
+        value_format = "%f"
+        matrix = matrix.astype(np_float64, copy=False)
+    row_format = " ".join([value_format] * num_columns) + terminator
+    blocks = []
+    for start in range(0, num_rows, FORMAT_CHUNK_ROWS):
+        chunk = matrix[start : start + FORMAT_CHUNK_ROWS]
+        blocks.append((row_format * len(chunk)) % tuple(chunk.ravel().tolist()))
+    return "".join(blocks)
+
+
+# Render a matrix to a list of strings, one string per row
+def render_float_rows(matrix: ndarray) -> list[str]:
+    if len(matrix) == 0:
+        return []
+    rows = []
+    for start in range(0, len(matrix), FORMAT_CHUNK_ROWS):
+        block = render_float_block(matrix[start : start + FORMAT_CHUNK_ROWS])
+        # Drop the last terminator so split() does not produce an empty trailing row
+        rows.extend(block[:-1].split("\n"))
+    return rows
+
+
+# Batched equivalent of [data_fromat(data) for data in unpacked_data]
+def format_data_column(unpacked_data: ndarray) -> list[str]:
+    return render_float_rows(column_as_matrix(unpacked_data))
+
+
+# Batched equivalent of [float_to_string(ms) for ms in miliseconds]
+def format_float_column(values: ndarray) -> list[str]:
+    return render_float_rows(values)
@@ -0,0 +1,121 @@
+from dataclasses import dataclass, field
+from multiprocessing.connection import Connection
+from time import perf_counter
+from typing import Dict, Optional
+
+# Minimum number of seconds between two progress messages of one task
+PROGRESS_INTERVAL = 0.5
+
+
+# Sends the progress of one worker task over the pipe, at most once every PROGRESS_INTERVAL seconds
+@dataclass
+class ProgressReporter:
+    pipe: Connection
+    task_id: any
+    part_index: Optional[int]
+    channel_label: str
+    file_name: str
+    samples_decoded: int = field(default=0)
+    rows_written: int = field(default=0)
+    total_rows: int = field(default=0)
+    bytes_written: int = field(default=0)
+    start_time: float = field(default_factory=perf_counter, init=False)
+    last_report_time: float = field(default=0, init=False)
+
+    # Update the counters and send them when the interval has passed (or force is set)
+    def update(self, force: bool = False, **counters):
+        for name, value in counters.items():
+            setattr(self, name, value)
+        now = perf_counter()
+        if not force and now - self.last_report_time < PROGRESS_INTERVAL:
+            return
+        self.last_report_time = now
+        self.pipe.send(
+            {
+                "task_id": self.task_id,
+                "message": "progress",
+                "progress": {
+                    "part_index": self.part_index,
+                    "channel_label": self.channel_label,
+                    "file_name": self.file_name,
+                    "samples_decoded": self.samples_decoded,
+                    "rows_written": self.rows_written,
+                    "total_rows": self.total_rows,
+                    "bytes_written": self.bytes_written,
+                    "elapsed": now - self.start_time,
+                },
+            }
+        )
+
+
+# Combines the progress messages of all tasks into overall progress, ETA and throughput.
+# Tasks are weighted by the number of input bytes they decode
+@dataclass
+class ProgressTracker:
+    start_time: float = field(default_factory=perf_counter, init=False)
+    # Input bytes and channel label of each task, by (task_id, part_index)
+    task_sizes: Dict[tuple, int] = field(default_factory=dict, init=False)
+    task_labels: Dict[tuple, str] = field(default_factory=dict, init=False)
+    # Latest progress message of each task
+    task_progress: Dict[tuple, dict] = field(default_factory=dict, init=False)
+    finished_task_ids: set = field(default_factory=set, init=False)
+
+    # Register the planned tasks (keyword arguments of worker_KDF_extract)
+    def add_tasks(self, tasks: list[Dict[str, any]]):
+        for kwargs in tasks:
+            key = (kwargs["task_id"], kwargs["part_index"])
+            self.task_sizes[key] = int(kwargs["data_size"])
+            self.task_labels[key] = kwargs["channel_label"]
+
+    def update(self, event: dict):
+        progress = event["progress"]
+        self.task_progress[(event["task_id"], progress["part_index"])] = progress
+
+    # Every part of the task is done, including tasks that failed before reporting
+    def finish_task(self, task_id: any):
+        self.finished_task_ids.add(task_id)
+
+    # Fraction of the task that is done, between 0 and 1
+    def get_task_fraction(self, key: tuple) -> float:
+        if key[0] in self.finished_task_ids:
+            return 1.0
+        progress = self.task_progress.get(key, None)
+        if progress is None or progress["total_rows"] == 0:
+            return 0.0
+        return min(1.0, progress["rows_written"] / progress["total_rows"])
+
+    def snapshot(self) -> Dict[str, any]:
+        elapsed = perf_counter() - self.start_time
+        total_bytes = sum(max(task_size, 1) for task_size in self.task_sizes.values())
+        done_bytes = 0
+        channel_bytes = {}
+        channel_done_bytes = {}
+        for key, task_size in self.task_sizes.items():
+            # Empty tasks still count, otherwise an empty channel would never be done
+            task_size = max(task_size, 1)
+            task_done_bytes = task_size * self.get_task_fraction(key)
+            done_bytes += task_done_bytes
+            label = self.task_labels[key]
+            channel_bytes[label] = channel_bytes.get(label, 0) + task_size
+            channel_done_bytes[label] = (
+                channel_done_bytes.get(label, 0) + task_done_bytes
+            )
+        fraction = done_bytes / total_bytes if total_bytes != 0 else 1.0
+        # The 1-byte weight of empty tasks is not input
+        done_bytes = min(done_bytes, sum(self.task_sizes.values()))
+        return {
+            "fraction": fraction,
+            # Fraction done of each channel label (all files and parts together)
+            "channels": {
+                label: channel_done_bytes[label] / channel_bytes[label]
+                for label in channel_bytes
+            },
+            "input_bytes_done": done_bytes,
+            "bytes_written": sum(
+                progress["bytes_written"] for progress in self.task_progress.values()
+            ),
+            "elapsed": elapsed,
+            # Input bytes decoded and written per second
+            "MB/s": done_bytes / 1e6 / elapsed if elapsed > 0 else 0,
+            "eta": (elapsed * (1 - fraction) / fraction if 0 < fraction < 1 else None),
+        }
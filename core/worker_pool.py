@@ -0,0 +1,109 @@
+# Process pool that outlives one extraction, the GUI keeps one for all its conversions so the
+# workers (and their numpy/msgpack imports) are only started once
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from os import getpid as os_getpid
+from threading import Lock
+from typing import Iterator, Optional
+
+from .utils import ExtractionControl, init_worker_control
+
+
+# Runs once in every worker when the pool is warmed up, the worker has imported
+# the extraction modules by the time it returns
+def warm_up_worker() -> int:
+    return os_getpid()
+
+
+@dataclass
+class WorkerPool:
+    num_worker: int = field(default=1)
+    # Control shared by every extraction run on the pool, reset when an extraction ends
+    control: ExtractionControl = field(default_factory=ExtractionControl)
+    executor: Optional[ProcessPoolExecutor] = field(
+        default=None, init=False, repr=False
+    )
+    lock: Lock = field(default_factory=Lock, init=False, repr=False)
+    # An extraction runs on the pool, extractions share control so only one runs at a time
+    busy: bool = field(default=False, init=False)
+
+    # The executor is created on first use, again after a worker crashed and broke it
+    def get_executor(self) -> ProcessPoolExecutor:
+        with self.lock:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.num_worker,
+                    initializer=init_worker_control,
+                    initargs=(self.control,),
+                )
+            return self.executor
+
+    def submit(self, function: callable, **kwargs) -> Future:
+        executor = self.get_executor()
+        try:
+            return executor.submit(function, **kwargs)
+        except BrokenProcessPool:
+            with self.lock:
+                if self.executor is executor:
+                    self.executor = None
+            return self.get_executor().submit(function, **kwargs)
+
+    # Reserve the pool for one extraction with num_worker workers, False when another
+    # extraction runs on it. The executor is only replaced while no extraction uses it
+    def reserve(self, num_worker: int) -> bool:
+        with self.lock:
+            if self.busy:
+                return False
+            self.busy = True
+            if num_worker != self.num_worker:
+                self.num_worker = num_worker
+                if self.executor is not None:
+                    self.executor.shutdown(wait=False)
+                    self.executor = None
+            return True
+
+    # The extraction that reserved the pool ended
+    def release(self):
+        with self.lock:
+            self.busy = False
+
+    # Start every worker process now, call it from a background thread so the window is not blocked
+    def warm_up(self):
+        futures = [self.submit(warm_up_worker) for _ in range(self.num_worker)]
+        for future in futures:
+            future.result()
+
+    # Stop the running extraction and the worker processes, used when the window is closed
+    def shutdown(self):
+        self.control.cancel()
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                self.executor = None
+
+
+# Submit function and control of one extraction. Without a pool a new one is created for the
+# extraction and shut down at the end, a WorkerPool is kept and its control reset for the next one
+@contextmanager
+def open_worker_pool(
+    num_worker: int,
+    control: Optional[ExtractionControl] = None,
+    pool: Optional[WorkerPool] = None,
+) -> Iterator[tuple[callable, ExtractionControl]]:
+    if pool is not None:
+        try:
+            yield pool.submit, pool.control
+        finally:
+            pool.control.reset()
+        return
+
+    if control is None:
+        control = ExtractionControl()
+    with ProcessPoolExecutor(
+        max_workers=num_worker,
+        initializer=init_worker_control,
+        initargs=(control,),
+    ) as executor:
+        yield executor.submit, control
@@ -0,0 +1,74 @@
+# List channels whose JSON array holds another number of events than total_values of the
+# channel header, every event is still written and #DATAPOINTS is the number of events
+# Usage: python -m unittest discover -s tests -t .
+from json import dumps as json_dumps
+from multiprocessing import Pipe
+from os.path import join as os_join
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from core.utils import iter_JSON_array, worker_KDF_extract
+
+EVENTS = [
+    {"label": f"Marker {index}", "len": 0, "pos": float(index * 1000)}
+    for index in range(5)
+]
+
+
+# Extract a list channel with the header count total_values, returns the .txt and .csv rows
+def extract_list_channel(total_values: int, formats: tuple[str, ...]) -> tuple:
+    parent_pipe, child_pipe = Pipe()
+    with TemporaryDirectory() as path_save_data:
+        worker_KDF_extract(
+            data_enc="list",
+            unit="",
+            raw_data=json_dumps(EVENTS).encode(),
+            measured_timestamp="2024-03-12T19:13:27Z",
+            total_values=total_values,
+            sample_rate=0,
+            channel_label="Markers",
+            channel_type="Markers",
+            file_name="test",
+            path_save_data=path_save_data,
+            pipe=child_pipe,
+            task_id=0,
+            formats=formats,
+        )
+        messages = []
+        while parent_pipe.poll():
+            messages.append(parent_pipe.recv()["message"])
+        with open(os_join(path_save_data, "Markers.txt")) as OSC_file:
+            OSC_lines = OSC_file.read().splitlines()
+        with open(os_join(path_save_data, "Markers.csv"), newline="") as CSV_file:
+            CSV_lines = CSV_file.read().splitlines()
+    return messages, OSC_lines, CSV_lines
+
+
+class ListChannelTest(TestCase):
+    def assert_all_events_written(self, total_values: int, formats: tuple[str, ...]):
+        messages, OSC_lines, CSV_lines = extract_list_channel(total_values, formats)
+        self.assertNotIn("failed", messages)
+        self.assertEqual(messages[-1], "end")
+        self.assertEqual(OSC_lines[:2], ["#DURATION N/A", f"#DATAPOINTS {len(EVENTS)}"])
+        rows = OSC_lines[3:]
+        self.assertEqual(len(rows), len(EVENTS))
+        self.assertTrue(rows[-1].endswith("label: Marker 4, len: 0, pos: 4000.0"))
+        self.assertEqual(len(CSV_lines), len(EVENTS))
+
+    def test_header_count_too_small(self):
+        self.assert_all_events_written(3, ("txt", "csv"))
+        self.assert_all_events_written(0, ("txt", "csv"))
+
+    def test_header_count_too_large(self):
+        self.assert_all_events_written(8, ("txt", "csv"))
+
+    def test_header_count_with_npy(self):
+        self.assert_all_events_written(3, ("txt", "csv", "npy"))
+        self.assert_all_events_written(8, ("txt", "csv", "npy"))
+
+    def test_JSON_array_blocks(self):
+        text = " , ".join(json_dumps(event) for event in EVENTS)
+        self.assertEqual(list(iter_JSON_array(f"[ {text} ]".encode())), EVENTS)
+        self.assertEqual(list(iter_JSON_array(b"[ ]")), [])
+        with self.assertRaises(ValueError):
+            list(iter_JSON_array(b'[{"label": "a"}, '))